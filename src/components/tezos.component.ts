@@ -17,6 +17,12 @@ interface GenericObject {
   [key: string]: string;
 }
 
+interface IDocumentStatus {
+  document: string;
+  issued: boolean;
+  revoked: boolean;
+}
+
 const verificationBuilder = (
   verifiers: any[]
 ) => (document: DocumentsToVerify, promisesCallback?: PromiseCallback): Promise<VerificationFragment[]> => {
@@ -189,13 +195,36 @@ export class TezosSmartContract implements ISmartContract {
     }
   }
 
-  private isVerified = async (payload: any): Promise<DocumentStoreIssuanceStatus> => {
+  public getDocumentStatuses = async (documentStore: string, merkleRoots: string[]): Promise<IDocumentStatus[]> => {
+    const contract = await this.tezos.contract.at(documentStore, tzip16);
+    const views = await contract.tzip16().metadataViews();
+    if (!views.getDocumentStatus) {
+      // stores originated before getDocumentStatus only expose the single-hash views
+      return Promise.all(merkleRoots.map(async (merkleRoot) => ({
+        document: merkleRoot,
+        issued: await views.isIssued().executeView(merkleRoot),
+        revoked: await views.isRevoked().executeView(merkleRoot),
+      })));
+    }
+    const statuses = await views.getDocumentStatus().executeView(merkleRoots);
+    return statuses.map((status: any, index: number) => ({
+      document: merkleRoots[index],
+      issued: status.issued !== null,
+      revoked: status.revoked !== null,
+    }));
+  }
+
+  private getDocumentStatus = async (payload: any): Promise<IDocumentStatus> => {
     const { documentStore, merkleRoot } = payload;
+    const [status] = await this.getDocumentStatuses(documentStore, [merkleRoot]);
+    return status;
+  }
+
+  private isVerified = async (payload: any): Promise<DocumentStoreIssuanceStatus> => {
+    const { documentStore, merkleRoot, documentStatus } = payload;
 
     try {
-      const contract = await this.tezos.contract.at(documentStore, tzip16);
-      const views = await contract.tzip16().metadataViews();
-      const result = await views.isIssued().executeView(merkleRoot);
+      const result = (await documentStatus).issued;
       if (result) {
         return {
           issued: true,
@@ -231,12 +260,10 @@ export class TezosSmartContract implements ISmartContract {
   }
 
   private isRevoked = async (payload: any): Promise<RevocationStatus> => {
-    const { documentStore, merkleRoot } = payload;
+    const { documentStore, merkleRoot, documentStatus } = payload;
 
     try {
-      const contract = await this.tezos.contract.at(documentStore, tzip16);
-      const views = await contract.tzip16().metadataViews();
-      const result = await views.isRevoked().executeView(merkleRoot);
+      const result = (await documentStatus).revoked;
       if (result) {
         return {
           revoked: true,
@@ -419,10 +446,16 @@ export class TezosSmartContract implements ISmartContract {
         }
         const documentStores = getIssuersDocumentStores(document);
         const merkleRoot = document.signature.merkleRoot;
+        // issuance and revocation are answered by a single view call per store
+        const documentStatuses = documentStores.map((documentStore) =>
+          this.getDocumentStatus({
+            documentStore, merkleRoot
+          })
+        );
         const issuanceStatuses = await Promise.all(
-          documentStores.map((documentStore) =>
+          documentStores.map((documentStore, index) =>
             this.isVerified({
-              documentStore, merkleRoot
+              documentStore, merkleRoot, documentStatus: documentStatuses[index]
             })
           )
         );
@@ -441,9 +474,9 @@ export class TezosSmartContract implements ISmartContract {
         }
 
         const revocationStatuses: RevocationStatus[] = await Promise.all(
-          documentStores.map((documentStore) =>
+          documentStores.map((documentStore, index) =>
             this.isRevoked({
-              documentStore, merkleRoot
+              documentStore, merkleRoot, documentStatus: documentStatuses[index]
             })
           )
         );
@@ -509,6 +542,9 @@ export class TezosSmartContract implements ISmartContract {
       metadataBigMap.set('', bytesUrl);
       const origination = await this.tezos.contract.originate({
         code: documentStoreJson,
+        // Must match the storage of the checked-in documentStore.json: add
+        // the keys of newer DocumentStore features only together with the
+        // rebuilt artifact (src/contracts/tezos/build.py).
         storage: {
           name,
           metadata: metadataBigMap,
@@ -552,6 +588,9 @@ export class TezosSmartContract implements ISmartContract {
       const metadataBigMap = new MichelsonMap();
       const bytesUrl = char2Bytes(this.tokenUrl);
       metadataBigMap.set('', bytesUrl);
+      // The rebuilt artifact is compiled with lazy entry points, whose
+      // lambdas are part of the initial storage: take init from the
+      // compiled storage then instead of writing it out here.
       const origination = await this.tezos.contract.originate({
         code: documentNftStoreJson,
         init: {
@@ -0,0 +1,317 @@
+"""Gas and storage benchmarks for DocumentStore and DocumentNFT.
+
+The SmartPy scenarios only check behaviour; the interpreter does not
+account for gas. This runner originates the compiled contracts in an
+octez-client mockup, pre-populates their storage, then measures one
+operation per entry point and size N:
+
+    python build.py --force && python benchmark.py
+
+For single-item entry points (issue, revoke, mint) N is the number of
+entries already in the big maps; for batch entry points it is also the
+batch size. Results are written as JSON (--report) and compared to a
+baseline (--baseline): the run fails when consumed gas or paid storage of
+a case grows past the tolerance, or when a full run no longer measures a
+case of the baseline. The baseline is checked in and only rewritten with
+--update-baseline; a missing baseline is an error.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+SIZES = [1, 10, 100, 1000]
+
+# Address compiled into the targets as owner/admin; replaced by the
+# mockup's bootstrap1 so it can call the restricted entry points.
+COMPILED_OWNER = "tz1NXLfpxJ2bF7ehyvwQN69AUZh8FCGPgjmn"
+# Store address compiled into DocumentGate, replaced by an originated store.
+COMPILED_STORE = "KT18amZmM5W7qDWVt2pH6uj7sCEd3kbzLrHT"
+
+TARGETS = {
+    "DocumentStore": "DocumentStore",
+    "DocumentStoreUnified": "DocumentStoreUnified",
+    "DocumentNFT": "FA2_Non_Fungible_Token",
+    "DocumentNFT_nft_ledger": "FA2_Non_Fungible_Token_nft_ledger",
+    "DocumentNFT_eager": "FA2_Non_Fungible_Token_eager",
+    "DocumentNFT_certificate": "FA2_Non_Fungible_Token_certificate",
+}
+
+
+def document(i, salt = 0):
+    return "0x%064x" % (salt << 128 | i)
+
+
+def documents(n, salt = 0, start = 0):
+    return "{ %s }" % " ; ".join(document(i, salt) for i in range(start, start + n))
+
+
+# Lengths of the token URIs minted: short ones, and long ones the size of a
+# real ipfs://<CIDv1>/metadata.json, so that the cost per metadata byte can
+# be told apart from the cost per token (see operationPacker.py).
+SHORT_URI = 20
+LONG_URI = 120
+
+
+def uri(i, length = SHORT_URI):
+    return "ipfs://" + str(i).zfill(length - len("ipfs://.json")) + ".json"
+
+
+def token(owner, i, length = SHORT_URI):
+    return 'Pair "%s" { Elt "" 0x%s }' % (owner, uri(i, length).encode().hex())
+
+
+def tokens(owner, n, start = 0, length = SHORT_URI):
+    return "{ %s }" % " ; ".join(token(owner, i, length) for i in range(start, start + n))
+
+
+def transfers(from_, to_, token_ids):
+    txs = " ; ".join('Pair "%s" (Pair %d 1)' % (to_, i) for i in token_ids)
+    return '{ Pair "%s" { %s } }' % (from_, txs)
+
+
+def operators(owner, operator, token_ids):
+    return "{ %s }" % " ; ".join('Left (Pair "%s" (Pair "%s" %d))' % (owner, operator, i) for i in token_ids)
+
+
+def chunks(n, size = 100):
+    for start in range(0, n, size):
+        yield start, min(size, n - start)
+
+
+# Each case is (entry point, setup, parameter): setup(n, a) yields the
+# (entry point, parameter) calls that pre-populate storage, parameter(n, a)
+# is the measured call. a holds the bootstrap addresses.
+
+def store_cases():
+    def prefill(n, a):
+        for start, size in chunks(n):
+            yield "bulkIssue", "Pair %s False" % documents(size, 1, start)
+    def prefill_issued(n, a):
+        yield from prefill(n, a)
+        for start, size in chunks(n):
+            yield "bulkIssue", "Pair %s False" % documents(size, 2, start)
+    return {
+        "issue": ("issue", prefill, lambda n, a: document(0, 2)),
+        "revoke": ("revoke", prefill, lambda n, a: document(0, 1)),
+        "bulkIssue": ("bulkIssue", prefill, lambda n, a: "Pair %s False" % documents(n, 2)),
+        "bulkRevoke": ("bulkRevoke", prefill_issued, lambda n, a: "Pair %s False" % documents(n, 2)),
+    }
+
+
+def nft_cases():
+    def prefill(n, a):
+        for start, size in chunks(n):
+            yield "mint_batch", tokens(a["bootstrap1"], size, start)
+    def prefill_operators(n, a):
+        yield from prefill(n, a)
+        for start, size in chunks(n):
+            yield "update_operators", operators(a["bootstrap1"], a["bootstrap2"], range(start, start + size))
+    return {
+        "mint": ("mint", prefill, lambda n, a: token(a["bootstrap2"], n)),
+        "mint_batch": ("mint_batch", prefill, lambda n, a: tokens(a["bootstrap2"], n, n)),
+        "mint_batch_long": ("mint_batch", prefill, lambda n, a: tokens(a["bootstrap2"], n, n, LONG_URI)),
+        "transfer": ("transfer", prefill, lambda n, a: transfers(a["bootstrap1"], a["bootstrap2"], range(n))),
+        "claim": ("claim", prefill, lambda n, a: transfers(a["bootstrap1"], a["bootstrap2"], range(n))),
+        "update_operators": ("update_operators", prefill,
+            lambda n, a: operators(a["bootstrap1"], a["bootstrap3"], range(n))),
+        "transfer_as_operator": ("transfer", prefill_operators,
+            lambda n, a: transfers(a["bootstrap1"], a["bootstrap3"], range(n)), "bootstrap2"),
+    }
+
+
+# metadata bytes per item of the mint cases
+ITEM_BYTES = {
+    "mint": SHORT_URI,
+    "mint_batch": SHORT_URI,
+    "mint_batch_long": LONG_URI,
+}
+
+CASES = {
+    "DocumentStore": store_cases,
+    "DocumentStoreUnified": store_cases,
+    "DocumentNFT": nft_cases,
+    "DocumentNFT_nft_ledger": nft_cases,
+    "DocumentNFT_eager": nft_cases,
+    "DocumentNFT_certificate": nft_cases,
+}
+
+
+class Mockup:
+    def __init__(self, client, protocol):
+        self.client = client
+        self.base_dir = tempfile.mkdtemp(prefix = "benchmark-")
+        command = ["--protocol", protocol] if protocol else []
+        try:
+            self.run(*command, "create", "mockup")
+            self.addresses = {
+                name: self.run("show", "address", name).split("Hash:")[1].split()[0]
+                for name in ["bootstrap1", "bootstrap2", "bootstrap3"]
+            }
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        shutil.rmtree(self.base_dir, ignore_errors = True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, *args):
+        result = subprocess.run(
+            [self.client, "--mode", "mockup", "--base-dir", self.base_dir] + list(args),
+            stdout = subprocess.PIPE, stderr = subprocess.STDOUT, universal_newlines = True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stdout)
+        return result.stdout
+
+    def originate(self, name, code, storage):
+        receipt = self.run(
+            "originate", "contract", name, "transferring", "0", "from", "bootstrap1",
+            "running", code, "--init", storage, "--burn-cap", "100", "--force"
+        )
+        return re.search(r"New contract (KT1\w+) originated", receipt).group(1)
+
+    def transfer(self, contract, sender, entrypoint, arg):
+        return self.run(
+            "transfer", "0", "from", sender, "to", contract, "--entrypoint", entrypoint,
+            "--arg", arg, "--burn-cap", "100"
+        )
+
+    def call(self, contract, sender, entrypoint, arg):
+        receipt = self.transfer(contract, sender, entrypoint, arg)
+        gas = sum(int(g.split(".")[0]) for g in re.findall(r"Consumed gas: ([\d.]+)", receipt))
+        storage = re.search(r"Paid storage size diff: (\d+) bytes", receipt)
+        return {"gas": gas, "storage": int(storage.group(1)) if storage else 0}
+
+
+def read_target(contracts, target):
+    directory = os.path.join(contracts, target)
+    with open(os.path.join(directory, "step_000_cont_0_contract.tz")) as f:
+        code = f.read()
+    with open(os.path.join(directory, "step_000_cont_0_storage.tz")) as f:
+        storage = f.read()
+    return code, storage
+
+
+def benchmark(mockup, contracts, sizes, only = None):
+    report = {}
+    for name, target in TARGETS.items():
+        code, storage = read_target(contracts, target)
+        storage = storage.replace(COMPILED_OWNER, mockup.addresses["bootstrap1"])
+        for case, spec in CASES[name]().items():
+            entrypoint, setup, parameter = spec[:3]
+            sender = spec[3] if len(spec) > 3 else "bootstrap1"
+            if only and case not in only:
+                continue
+            for n in sizes:
+                key = "%s.%s.%d" % (name, case, n)
+                contract = "%s_%s_%d" % (name, case, n)
+                mockup.originate(contract, code, storage)
+                try:
+                    for setup_entrypoint, arg in setup(n, mockup.addresses):
+                        mockup.call(contract, "bootstrap1", setup_entrypoint, arg)
+                    report[key] = mockup.call(contract, sender, entrypoint, parameter(n, mockup.addresses))
+                except RuntimeError as e:
+                    # e.g. a batch of 1000 over the operation gas limit, or
+                    # operators on a target built without them
+                    report[key] = {"gas": None, "storage": None, "error": str(e).strip().splitlines()[-1]}
+                if case in ITEM_BYTES:
+                    report[key]["item_bytes"] = ITEM_BYTES[case]
+                print(key, json.dumps(report[key]))
+    return report
+
+
+def benchmark_gate(mockup, contracts, sizes):
+    """Cost of one synchronous isValid check through the on-chain views."""
+    report = {}
+    for name, target in [("DocumentStore", "DocumentStore"), ("DocumentStoreUnified", "DocumentStoreUnified")]:
+        code, storage = read_target(contracts, target)
+        storage = storage.replace(COMPILED_OWNER, mockup.addresses["bootstrap1"])
+        gate_code, gate_storage = read_target(contracts, "DocumentGate")
+        for n in sizes:
+            key = "DocumentGate.%s.check.%d" % (name, n)
+            store = mockup.originate("%s_gate_%d" % (name, n), code, storage)
+            for _, arg in store_cases()["issue"][1](n, mockup.addresses):
+                mockup.call("%s_gate_%d" % (name, n), "bootstrap1", "bulkIssue", arg)
+            mockup.originate("DocumentGate_%s_%d" % (name, n), gate_code, gate_storage.replace(COMPILED_STORE, store))
+            report[key] = mockup.call("DocumentGate_%s_%d" % (name, n), "bootstrap1", "check", document(0, 1))
+            print(key, json.dumps(report[key]))
+    return report
+
+
+def regressions(report, baseline, tolerance, partial = False):
+    failures = []
+    if not partial:
+        # a case dropped from the runner would otherwise escape the gate
+        failures += ["%s: no longer measured" % key for key in sorted(set(baseline) - set(report))]
+    for key, result in sorted(report.items()):
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        for metric in ["gas", "storage"]:
+            if expected.get(metric) is None:
+                continue
+            if result.get(metric) is None:
+                failures.append("%s: %s no longer fits in an operation" % (key, metric))
+            elif result[metric] > expected[metric] * (1 + tolerance):
+                failures.append("%s: %s %d > baseline %d" % (key, metric, result[metric], expected[metric]))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument("--contracts", default = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build"),
+        help = "SmartPy compile output directory")
+    parser.add_argument("--client", default = "octez-client")
+    parser.add_argument("--protocol", default = None, help = "mockup protocol hash (default: client's)")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = SIZES)
+    parser.add_argument("--cases", nargs = "+", default = None, help = "only run these cases")
+    parser.add_argument("--report", default = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "benchmark.json"))
+    parser.add_argument("--baseline", default = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json"))
+    parser.add_argument("--tolerance", type = float, default = 0.02, help = "allowed relative increase")
+    parser.add_argument("--update-baseline", action = "store_true")
+    args = parser.parse_args()
+
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        print("no baseline at", args.baseline, "(write one with --update-baseline)")
+        return 1
+
+    try:
+        mockup = Mockup(args.client, args.protocol)
+    except OSError as e:
+        print("octez-client not usable (--client %s): %s" % (args.client, e))
+        return 2
+    with mockup:
+        report = benchmark(mockup, args.contracts, args.sizes, args.cases)
+        if not args.cases or "check" in args.cases:
+            report.update(benchmark_gate(mockup, args.contracts, args.sizes))
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok = True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent = 2, sort_keys = True)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent = 2, sort_keys = True)
+        print("baseline written to", args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        failures = regressions(report, json.load(f), args.tolerance,
+            partial = bool(args.cases) or args.sizes != SIZES)
+    for failure in failures:
+        print("REGRESSION", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
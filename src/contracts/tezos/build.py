@@ -0,0 +1,136 @@
+"""Build the Tezos contract artifacts.
+
+Compiles every SmartPy source of this directory into build/ with the
+SmartPy CLI, then copies the artifacts used by tezos.component.ts next to
+the sources. A source is only recompiled when the hash of its files (the
+source, the local scripts it imports and the SmartPy version) differs from
+the one recorded in build.lock.json, or when an artifact is missing:
+
+    python build.py            # rebuild what changed
+    python build.py --force    # rebuild everything
+    python build.py --check    # fail if artifacts are out of date
+
+Local scripts import each other through file: URLs relative to this
+directory. documentNFT.py still imports the FA2 template from smartpy.io,
+which the hash does not cover: use --force after a template update.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+BUILD = os.path.join(DIRECTORY, "build")
+LOCK = os.path.join(DIRECTORY, "build.lock.json")
+
+# source -> local scripts it imports, including those of its test scenarios
+SOURCES = {
+    "smartContractPYSourceCode.py": ["documentReplica.py", "operationPacker.py"],
+    "documentNFT.py": ["documentReplica.py", "operationPacker.py"],
+}
+
+# checked-in artifact -> (source, compilation target, SmartPy output file)
+ARTIFACTS = {
+    "documentStore.json": ("smartContractPYSourceCode.py", "DocumentStore", "step_000_cont_0_contract.json"),
+    "metadata.json": ("smartContractPYSourceCode.py", "DocumentStore", "step_000_cont_0_metadata.metadata.json"),
+    "documentNftStore.json": ("documentNFT.py", "FA2_Non_Fungible_Token", "step_000_cont_0_contract.json"),
+}
+
+
+def smartpy_cli():
+    return os.environ.get("SMARTPY_CLI", os.path.expanduser("~/smartpy-cli/SmartPy.sh"))
+
+
+class CliError(Exception):
+    """The SmartPy CLI is missing or failed."""
+
+
+def smartpy_version():
+    try:
+        result = subprocess.run([smartpy_cli(), "--version"], stdout = subprocess.PIPE, universal_newlines = True, check = True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise CliError("SmartPy CLI not usable at %s (set SMARTPY_CLI): %s" % (smartpy_cli(), e))
+    return result.stdout.strip()
+
+
+def source_hash(source, version):
+    digest = hashlib.sha256(version.encode())
+    for name in [source] + SOURCES[source]:
+        with open(os.path.join(DIRECTORY, name), "rb") as f:
+            digest.update(name.encode() + b"\0" + f.read())
+    return digest.hexdigest()
+
+
+def artifacts_of(source):
+    return [artifact for artifact, (origin, _, _) in ARTIFACTS.items() if origin == source]
+
+
+def compile_source(source):
+    # compile from this directory so that file: imports resolve
+    try:
+        subprocess.run([smartpy_cli(), "compile", source, BUILD], cwd = DIRECTORY, check = True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise CliError("compiling %s failed: %s" % (source, e))
+
+
+def copy_artifacts(source):
+    for artifact in artifacts_of(source):
+        _, target, output = ARTIFACTS[artifact]
+        shutil.copyfile(os.path.join(BUILD, target, output), os.path.join(DIRECTORY, artifact))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument("--force", action = "store_true", help = "rebuild every source")
+    parser.add_argument("--check", action = "store_true", help = "only report out-of-date sources")
+    args = parser.parse_args()
+
+    lock = {}
+    if os.path.exists(LOCK):
+        with open(LOCK) as f:
+            lock = json.load(f)
+    try:
+        version = smartpy_version()
+    except CliError as e:
+        print(e)
+        return 2
+
+    stale = []
+    for source in SOURCES:
+        current = source_hash(source, version)
+        missing = [a for a in artifacts_of(source) if not os.path.exists(os.path.join(DIRECTORY, a))]
+        if args.force or missing or lock.get(source) != current:
+            stale.append((source, current))
+
+    if args.check:
+        for source, _ in stale:
+            print("out of date:", source)
+        return 1 if stale else 0
+
+    status = 0
+    for source, current in stale:
+        print("compiling", source)
+        try:
+            compile_source(source)
+        except CliError as e:
+            # keep the lock entries of the sources already rebuilt
+            print(e)
+            status = 2
+            break
+        copy_artifacts(source)
+        lock[source] = current
+    if not stale:
+        print("up to date")
+
+    with open(LOCK, "w") as f:
+        json.dump(lock, f, indent = 2, sort_keys = True)
+        f.write("\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,191 @@ FA2 = sp.io.import_script_from_url("https://smartpy.io/templates/FA2.py")
 # Set address of admin
 FA2_admin = sp.address("tz1NXLfpxJ2bF7ehyvwQN69AUZh8FCGPgjmn")
 
-class DocumentNFT(FA2.FA2_change_metadata, FA2.FA2_token_metadata, FA2.FA2_mint, FA2.FA2_administrator, FA2.FA2_pause, FA2.FA2_core):
+mint_params_type = sp.TRecord(
+    address = sp.TAddress,
+    metadata = sp.TMap(sp.TString, sp.TBytes)
+).layout(("address", "metadata"))
+
+# Sibling hash of a merkle proof step, on the left or right of the path
+merkle_step_type = sp.TVariant(
+    left = sp.TBytes,
+    right = sp.TBytes
+).layout(("left", "right"))
+
+# Approval of an operator for every token of an owner, present and future
+operator_for_all_type = sp.TRecord(
+    owner = sp.TAddress,
+    operator = sp.TAddress
+).layout(("owner", "operator"))
+
+# Page of the owner index: the owner's token count and the requested ids
+tokens_of_owner_type = sp.TRecord(
+    total = sp.TNat,
+    token_ids = sp.TList(sp.TNat)
+).layout(("total", "token_ids"))
+
+# Levels of a document anchored by issue_and_mint
+document_record_type = sp.TRecord(
+    issued = sp.TNat,
+    revoked = sp.TOption(sp.TNat)
+).layout(("issued", "revoked"))
+
+# Same layout as DocumentStore's tDocumentStatus
+document_status_type = sp.TRecord(
+    document = sp.TBytes,
+    issued = sp.TOption(sp.TNat),
+    revoked = sp.TOption(sp.TNat)
+).layout(("document", ("issued", "revoked")))
+
+# Contract events, so indexers can follow the ledger without polling it
+mint_event_type = sp.TRecord(
+    token_id = sp.TNat,
+    owner = sp.TAddress,
+    level = sp.TNat,
+    minter = sp.TAddress
+).layout(("token_id", ("owner", ("level", "minter"))))
+
+# Same payload as DocumentStore's tDocumentEvent, tagged "issued"/"revoked"
+document_event_type = sp.TRecord(
+    document = sp.TBytes,
+    level = sp.TNat,
+    issuer = sp.TAddress
+).layout(("document", ("level", "issuer")))
+
+transfer_event_type = sp.TRecord(
+    token_id = sp.TNat,
+    from_ = sp.TAddress,
+    to_ = sp.TAddress,
+    amount = sp.TNat,
+    level = sp.TNat,
+    operator = sp.TAddress
+).layout(("token_id", ("from_", ("to_", ("amount", ("level", "operator"))))))
+
+class DocumentNFT_config(FA2.FA2_config):
+    def __init__(self, nft_ledger = False, base_uri = False, merkle_claim = False, operator_for_all = False,
+                 owner_index = False, anchor_documents = False, pausable = True, settable_metadata = True, embed_config = True, **kargs):
+        FA2.FA2_config.__init__(self, **kargs)
+        # Every certificate has a supply of 1, so the ledger can map
+        # token_id -> owner instead of (owner, token_id) -> balance.
+        self.nft_ledger = nft_ledger
+        if nft_ledger:
+            self.name += "-nft_ledger"
+        # Tokens store only the end of their URI; the shared beginning is
+        # stored once in base_uris and prepended by the views. The raw
+        # token_metadata big_map then holds the end and a packed "base" key,
+        # not a TZIP-12 URI: indexers that read the big_map instead of the
+        # token_metadata view show broken URIs, so only use this mode when
+        # consumers go through the views. Bases are write-once and must
+        # exist before a token uses them, so issued URIs never change.
+        self.base_uri = base_uri
+        if base_uri:
+            self.name += "-base_uri"
+        # The admin commits a merkle root per cohort and recipients (or a
+        # relayer) mint their own token by presenting a proof.
+        self.merkle_claim = merkle_claim
+        if merkle_claim:
+            self.name += "-merkle_claim"
+        # A custodian can be approved once for all tokens of an owner
+        # instead of once per (owner, operator, token_id).
+        self.operator_for_all = operator_for_all
+        if operator_for_all:
+            self.name += "-operator_for_all"
+        # Each owner's tokens are kept as a dense array (owner, index) ->
+        # token_id, so wallets can page through them. Tokens have a supply
+        # of 1, so a transfer moves one id from one array to another.
+        self.owner_index = owner_index
+        if owner_index:
+            self.name += "-owner_index"
+        # The contract anchors document hashes itself, like DocumentStore,
+        # so a certificate is issued and minted in one operation and
+        # verified with one view call.
+        self.anchor_documents = anchor_documents
+        if anchor_documents:
+            self.name += "-anchor_documents"
+        # Without pausable there is no paused flag in storage, no set_pause
+        # entry point and no pause check on every call.
+        self.pausable = pausable
+        if not pausable:
+            self.name += "-no_pause"
+        self.settable_metadata = settable_metadata
+        if not settable_metadata:
+            self.name += "-no_set_metadata"
+        # The TZIP-16 metadata normally embeds the whole configuration.
+        self.embed_config = embed_config
+        if not embed_config:
+            self.name += "-no_embed_config"
+
+def certificate_config():
+    """Configuration for document certificates: every token has a supply of
+    1, is minted by the admin and is never paused, approved or re-described.
+    Everything but the mint and transfer path is lazy."""
+    return DocumentNFT_config(
+        non_fungible = True,
+        lazy_entry_points = True,
+        use_token_metadata_offchain_view = True,
+        nft_ledger = True,
+        store_total_supply = False,
+        support_operator = False,
+        pausable = False,
+        settable_metadata = False,
+        embed_config = False
+    )
+
+def set_pause(self, params):
+    sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
+    self.data.paused = params
+
+def set_metadata(self, k, v):
+    sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
+    self.data.metadata[k] = v
+
+def is_claimed(self, token):
+    """Ask whether a cohort token was minted with its proof."""
+    sp.result(self.data.claimed.contains(self.claim_leaf(token)))
+
+def is_operator_for_all(self, query):
+    """Ask operator is approved for all tokens of owner."""
+    sp.set_type(query, operator_for_all_type)
+    sp.result(self.data.operators_for_all.contains(query))
+
+def tokens_of_owner(self, params):
+    """Get a page of the token IDs of owner, with their total count."""
+    sp.set_type(params, sp.TRecord(owner = sp.TAddress, offset = sp.TNat, limit = sp.TNat).layout(("owner", ("offset", "limit"))))
+    total = sp.local("total", self.data.owner_token_count.get(params.owner, default_value = 0))
+    end = sp.local("end", params.offset + params.limit)
+    sp.if end.value > total.value:
+        end.value = total.value
+    token_ids = sp.local("token_ids", sp.list(t = sp.TNat))
+    sp.for index in sp.range(params.offset, end.value):
+        token_ids.value.push(self.data.owner_tokens[sp.pair(params.owner, index)])
+    sp.result(sp.set_type_expr(sp.record(total = total.value, token_ids = token_ids.value.rev()), tokens_of_owner_type))
+
+def document_status(self, document):
+    """Get issued and revoked levels of an anchored document."""
+    sp.set_type(document, sp.TBytes)
+    sp.result(self.anchored_status(document))
+
+def token_document_status(self, tok):
+    """Get the anchored document of token ID with its levels."""
+    sp.set_type(tok, sp.TNat)
+    sp.result(self.anchored_status(self.data.token_document.get(tok, message = self.error_message.token_undefined())))
+
+def is_operator(self, query):
+    """Ask sender is operator of token ID."""
+    sp.set_type(query,
+                sp.TRecord(token_id = sp.TNat,
+                           owner = sp.TAddress,
+                           operator = sp.TAddress).layout(
+                               ("owner", ("operator", "token_id"))))
+    is_member = self.operator_set.is_member(self.data.operators,
+                                            query.owner,
+                                            query.operator,
+                                            query.token_id)
+    if self.config.operator_for_all:
+        is_member |= self.is_operator_for_all_of(query.owner, query.operator)
+    sp.result(is_member)
+
+class DocumentNFT(FA2.FA2_token_metadata, FA2.FA2_mint, FA2.FA2_administrator, FA2.FA2_core):
     def __init__(self, config, metadata, admin):
         list_of_views = [
             self.total_token
@@ -12,9 +196,29 @@ class DocumentNFT(FA2.FA2_change_metadata, FA2.FA2_token_metadata, FA2.FA2_mint,
             , self.administrator
             , self.is_admin
             , self.does_token_exist
-            , self.is_operator
             , self.is_owner
         ]
+        # Views reading optional storage are only attached with it, like
+        # the set_pause entry point, so that other configurations compile.
+        if config.support_operator:
+            self.is_operator = sp.offchain_view(pure = True)(is_operator)
+            list_of_views.append(self.is_operator)
+        if config.merkle_claim:
+            self.is_claimed = sp.offchain_view(pure = True)(is_claimed)
+            list_of_views.append(self.is_claimed)
+        if config.operator_for_all:
+            self.is_operator_for_all = sp.offchain_view(pure = True)(is_operator_for_all)
+            list_of_views.append(self.is_operator_for_all)
+        if config.owner_index:
+            self.tokens_of_owner = sp.offchain_view(pure = True)(tokens_of_owner)
+            list_of_views.append(self.tokens_of_owner)
+        if config.anchor_documents:
+            self.document_status = sp.offchain_view(pure = True)(document_status)
+            list_of_views.append(self.document_status)
+            self.token_document_status = sp.offchain_view(pure = True)(token_document_status)
+            list_of_views.append(self.token_document_status)
+        if config.use_token_metadata_offchain_view or config.base_uri:
+            list_of_views.append(self.token_metadata)
 
         metadata_base = {
             "version": config.name # will be changed if using fatoo.
@@ -40,117 +244,341 @@ class DocumentNFT(FA2.FA2_change_metadata, FA2.FA2_token_metadata, FA2.FA2_mint,
                 , "receiver": "owner-no-hook"
                 , "sender": "owner-no-hook"
             }
-            , "fa2-smartpy": {
+        }
+        if config.embed_config:
+            metadata_base["fa2-smartpy"] = {
                 "configuration" :
                 dict([(k, getattr(config, k)) for k in dir(config) if "__" not in k and k != 'my_map'])
             }
-        }
+        else:
+            metadata_base["description"] = "Document certificates (TZIP-012), configuration " + config.name + "."
         self.init_metadata("metadata_base", metadata_base)
-        FA2.FA2_core.__init__(self, config, metadata, paused = False, administrator = admin)
+        extra_storage = dict(administrator = admin)
+        if config.pausable:
+            extra_storage["paused"] = False
+            self.set_pause = sp.entry_point(set_pause)
+        if config.settable_metadata:
+            self.set_metadata = sp.entry_point(set_metadata)
+        FA2.FA2_core.__init__(self, config, metadata, **extra_storage)
+        if self.config.nft_ledger:
+            self.update_initial_storage(
+                ledger = self.config.my_map(tkey = sp.TNat, tvalue = sp.TAddress)
+            )
+        if self.config.base_uri:
+            self.update_initial_storage(
+                base_uris = self.config.my_map(tkey = sp.TNat, tvalue = sp.TBytes)
+            )
+        if self.config.merkle_claim:
+            self.update_initial_storage(
+                claim_roots = self.config.my_map(tkey = sp.TBytes, tvalue = sp.TUnit),
+                claimed = self.config.my_map(tkey = sp.TBytes, tvalue = sp.TUnit)
+            )
+        if self.config.operator_for_all:
+            self.update_initial_storage(
+                operators_for_all = self.config.my_map(tkey = operator_for_all_type, tvalue = sp.TUnit)
+            )
+        if self.config.owner_index:
+            self.update_initial_storage(
+                owner_token_count = self.config.my_map(tkey = sp.TAddress, tvalue = sp.TNat),
+                owner_tokens = self.config.my_map(tkey = sp.TPair(sp.TAddress, sp.TNat), tvalue = sp.TNat),
+                token_index = self.config.my_map(tkey = sp.TNat, tvalue = sp.TNat)
+            )
+        if self.config.anchor_documents:
+            self.update_initial_storage(
+                documents = self.config.my_map(tkey = sp.TBytes, tvalue = document_record_type),
+                token_document = self.config.my_map(tkey = sp.TNat, tvalue = sp.TBytes)
+            )
 
-    def mint_mono(self, params): 
-        amount = 1  
-        token_id = self.data.all_tokens
-        token_id_after = abs(self.data.all_tokens - 1)
+    def is_operator_for_all_of(self, owner, operator):
+        return self.data.operators_for_all.contains(sp.record(owner = owner, operator = operator))
+
+    def verify_not_paused(self):
+        if self.config.pausable:
+            sp.verify(~ self.data.paused, message = self.error_message.paused())
+
+    def claim_leaf(self, params):
+        return sp.blake2b(sp.pack(sp.set_type_expr(params, mint_params_type)))
+
+    def merkle_root(self, leaf, proof):
+        node = sp.local("node", leaf)
+        sp.for step in proof:
+            with step.match_cases() as arg:
+                with arg.match("left") as sibling:
+                    node.value = sp.blake2b(sibling + node.value)
+                with arg.match("right") as sibling:
+                    node.value = sp.blake2b(node.value + sibling)
+        return node.value
 
-        user = self.ledger_key.make(params.address, token_id)
-        sp.if self.data.ledger.contains(user):
-            self.data.ledger[user].balance += amount
+    def token_base(self, token_info):
+        # token_info["base"], when present, is the packed id of the base URI
+        # of the token; otherwise base 0 is used.
+        base = sp.local("base", sp.nat(0))
+        sp.if token_info.contains("base"):
+            base.value = sp.unpack(token_info["base"], sp.TNat).open_some(message = "INVALID_BASE_URI")
+        return base.value
+
+    def token_full_uri(self, token_info):
+        # token_info[""] holds the end of the URI
+        return self.data.base_uris.get(self.token_base(token_info), default_value = sp.bytes("0x")) + token_info[""]
+
+    def owner_index_add(self, owner, token_id):
+        index = sp.local("index", self.data.owner_token_count.get(owner, default_value = 0))
+        self.data.owner_tokens[sp.pair(owner, index.value)] = token_id
+        self.data.token_index[token_id] = index.value
+        self.data.owner_token_count[owner] = index.value + 1
+
+    def owner_index_remove(self, owner, token_id):
+        # The last token of the owner takes the place of the removed one.
+        index = sp.local("index", self.data.token_index[token_id])
+        last = sp.local("last", sp.as_nat(self.data.owner_token_count[owner] - 1))
+        sp.if index.value != last.value:
+            moved = sp.local("moved", self.data.owner_tokens[sp.pair(owner, last.value)])
+            self.data.owner_tokens[sp.pair(owner, index.value)] = moved.value
+            self.data.token_index[moved.value] = index.value
+        del self.data.owner_tokens[sp.pair(owner, last.value)]
+        sp.if last.value == 0:
+            del self.data.owner_token_count[owner]
         sp.else:
-            self.data.ledger[user] = FA2.Ledger_value.make(amount)
-        sp.if ~ self.token_id_set.contains(self.data.all_tokens, token_id):
-            self.token_id_set.add(self.data.all_tokens, token_id)
-            self.data.token_metadata[token_id_after] = sp.record(
-                token_id    = token_id_after,
-                token_info  = params.metadata
-            )
+            self.data.owner_token_count[owner] = last.value
+
+    def mint_mono(self, params): 
+        # The token id is allocated here and is always fresh, so every write
+        # is unconditional.
+        token_id = sp.local("token_id", self.data.all_tokens)
+        if self.config.base_uri:
+            sp.verify(self.data.base_uris.contains(self.token_base(params.metadata)), message = "BASE_URI_UNDEFINED")
+        if self.config.nft_ledger:
+            self.data.ledger[token_id.value] = params.address
+        else:
+            user = self.ledger_key.make(params.address, token_id.value)
+            self.data.ledger[user] = FA2.Ledger_value.make(1)
+        self.data.token_metadata[token_id.value] = sp.record(
+            token_id    = token_id.value,
+            token_info  = params.metadata
+        )
+        self.data.all_tokens = token_id.value + 1
         if self.config.store_total_supply:
-            self.data.total_supply[token_id_after] = amount + self.data.total_supply.get(token_id_after, default_value = 0)
-    
-    @sp.entry_point
+            self.data.total_supply[token_id.value] = 1
+        if self.config.owner_index:
+            self.owner_index_add(params.address, token_id.value)
+        sp.emit(sp.set_type_expr(sp.record(
+            token_id = token_id.value,
+            owner = params.address,
+            level = sp.level,
+            minter = sp.sender
+        ), mint_event_type), tag = "minted", with_type = True)
+
+    def ledger_transfer(self, current_from, tx):
+        # Hot loop of transfer and claim: each ledger entry is read once and
+        # written once. Token existence comes from the ledger read itself;
+        # token_metadata is only consulted when there is no such read (zero
+        # amount) or to pick the error message of a failing tx.
+        if self.config.nft_ledger:
+            owner = sp.local("owner", self.data.ledger.get(tx.token_id, message = self.error_message.token_undefined()))
+            sp.if (tx.amount > 0):
+                sp.verify(
+                    (tx.amount == 1) & (owner.value == current_from),
+                    message = self.error_message.insufficient_balance())
+                self.data.ledger[tx.token_id] = tx.to_
+                if self.config.owner_index:
+                    self.owner_index_remove(current_from, tx.token_id)
+                    self.owner_index_add(tx.to_, tx.token_id)
+                self.emit_transfer(current_from, tx)
+        else:
+            sp.if (tx.amount > 0):
+                from_user = self.ledger_key.make(current_from, tx.token_id)
+                balance = sp.local("balance", self.data.ledger.get(from_user, default_value = FA2.Ledger_value.make(0)).balance)
+                sp.if balance.value < tx.amount:
+                    sp.verify(
+                        self.data.token_metadata.contains(tx.token_id),
+                        message = self.error_message.token_undefined())
+                    sp.failwith(self.error_message.insufficient_balance())
+                self.data.ledger[from_user] = FA2.Ledger_value.make(sp.as_nat(balance.value - tx.amount))
+                to_user = self.ledger_key.make(tx.to_, tx.token_id)
+                self.data.ledger[to_user] = FA2.Ledger_value.make(
+                    self.data.ledger.get(to_user, default_value = FA2.Ledger_value.make(0)).balance + tx.amount)
+                if self.config.owner_index:
+                    self.owner_index_remove(current_from, tx.token_id)
+                    self.owner_index_add(tx.to_, tx.token_id)
+                self.emit_transfer(current_from, tx)
+            sp.else:
+                sp.verify(
+                    self.data.token_metadata.contains(tx.token_id),
+                    message = self.error_message.token_undefined())
+
+    def emit_document(self, tag, document):
+        sp.emit(sp.set_type_expr(sp.record(
+            document = document,
+            level = sp.level,
+            issuer = sp.sender
+        ), document_event_type), tag = tag, with_type = True)
+
+    def emit_transfer(self, current_from, tx):
+        sp.emit(sp.set_type_expr(sp.record(
+            token_id = tx.token_id,
+            from_ = current_from,
+            to_ = tx.to_,
+            amount = tx.amount,
+            level = sp.level,
+            operator = sp.sender
+        ), transfer_event_type), tag = "transferred", with_type = True)
+
+    # With lazy_entry_points, every entry point is stored in a big_map and
+    # only parsed when called, except the hot path below (mint, mint_batch,
+    # issue_and_mint, transfer), which stays in the script: a call then
+    # only pays for the code it runs plus the small dispatcher.
+    @sp.entry_point(lazify = False)
     def mint(self, params):
         sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
-        sp.verify( ~self.is_paused(), message = self.error_message.paused() ) # is not paused
+        self.verify_not_paused()
         self.mint_mono(params)
 
-    @sp.entry_point
+    @sp.entry_point(lazify = False)
     def mint_batch(self, params):
         sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
-        sp.verify( ~self.is_paused(), message = self.error_message.paused() ) # is not paused
+        self.verify_not_paused()
         sp.for token in params:
             self.mint_mono(token)
 
+    @sp.entry_point(lazify = False)
+    def issue_and_mint(self, params):
+        # Anchors the document hash and mints its certificate atomically.
+        sp.set_type(params, sp.TRecord(
+            document = sp.TBytes,
+            address = sp.TAddress,
+            metadata = sp.TMap(sp.TString, sp.TBytes)
+        ).layout(("document", ("address", "metadata"))))
+        sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
+        self.verify_not_paused()
+        if self.config.anchor_documents:
+            sp.verify(~ self.data.documents.contains(params.document), message = "DOCUMENT_ALREADY_ISSUED")
+            self.data.documents[params.document] = sp.record(issued = sp.level, revoked = sp.none)
+            self.data.token_document[self.data.all_tokens] = params.document
+            self.emit_document("issued", params.document)
+            self.mint_mono(sp.record(address = params.address, metadata = params.metadata))
+        else:
+            sp.failwith("ANCHOR_DOCUMENTS_UNSUPPORTED")
+
+    @sp.entry_point
+    def revoke_document(self, document):
+        sp.set_type(document, sp.TBytes)
+        sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
+        self.verify_not_paused()
+        if self.config.anchor_documents:
+            record = sp.local("record", self.data.documents.get(document, message = "DOCUMENT_UNDEFINED"))
+            sp.verify(record.value.revoked.is_none(), message = "DOCUMENT_ALREADY_REVOKED")
+            self.data.documents[document] = sp.record(issued = record.value.issued, revoked = sp.some(sp.level))
+            self.emit_document("revoked", document)
+        else:
+            sp.failwith("ANCHOR_DOCUMENTS_UNSUPPORTED")
+
+    @sp.entry_point
+    def add_claim_root(self, root):
+        sp.set_type(root, sp.TBytes)
+        sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
+        if self.config.merkle_claim:
+            self.data.claim_roots[root] = sp.unit
+        else:
+            sp.failwith("MERKLE_CLAIM_UNSUPPORTED")
+
+    @sp.entry_point
+    def mint_with_proof(self, params):
+        # Anyone may submit: the leaf fixes both the recipient and the metadata.
+        sp.set_type(params, sp.TRecord(
+            address = sp.TAddress,
+            metadata = sp.TMap(sp.TString, sp.TBytes),
+            proof = sp.TList(merkle_step_type)
+        ).layout(("address", ("metadata", "proof"))))
+        self.verify_not_paused()
+        if self.config.merkle_claim:
+            token = sp.record(address = params.address, metadata = params.metadata)
+            leaf = sp.local("leaf", self.claim_leaf(token))
+            sp.verify(
+                self.data.claim_roots.contains(self.merkle_root(leaf.value, params.proof)),
+                message = "INVALID_PROOF")
+            sp.verify(~ self.data.claimed.contains(leaf.value), message = "ALREADY_CLAIMED")
+            self.data.claimed[leaf.value] = sp.unit
+            self.mint_mono(token)
+        else:
+            sp.failwith("MERKLE_CLAIM_UNSUPPORTED")
+
     @sp.entry_point
     def claim(self, params):
         sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
-        sp.verify( ~self.is_paused(), message = self.error_message.paused() ) # is not paused
+        self.verify_not_paused()
         sp.set_type(params, self.batch_transfer.get_type())
 
         sp.for transfer in params:
            current_from = transfer.from_
            sp.for tx in transfer.txs:
-                sp.verify(
-                    self.data.token_metadata.contains(tx.token_id),
-                    message = self.error_message.token_undefined()
-                )
-                # If amount is 0 we do nothing now:
-                sp.if (tx.amount > 0):
-                    from_user = self.ledger_key.make(current_from, tx.token_id)
-                    sp.verify(
-                        (self.data.ledger[from_user].balance >= tx.amount),
-                        message = self.error_message.insufficient_balance())
-                    to_user = self.ledger_key.make(tx.to_, tx.token_id)
-                    self.data.ledger[from_user].balance = sp.as_nat(
-                        self.data.ledger[from_user].balance - tx.amount)
-                    sp.if self.data.ledger.contains(to_user):
-                        self.data.ledger[to_user].balance += tx.amount
-                    sp.else:
-                         self.data.ledger[to_user] = FA2.Ledger_value.make(tx.amount)
-                sp.else:
-                    pass
+                self.ledger_transfer(current_from, tx)
                     
-    @sp.entry_point
+    @sp.entry_point(lazify = False)
     def transfer(self, params):
-        sp.verify( ~self.is_paused(), message = self.error_message.paused() )
+        self.verify_not_paused()
         sp.set_type(params, self.batch_transfer.get_type())
         sp.for transfer in params:
            current_from = transfer.from_
+           # Checks that do not depend on the token are resolved once per
+           # from_; the operator set is only looked up when they fail.
+           # sender_verify = ((self.is_administrator(sp.sender)) |
+           #                 (current_from == sp.sender))
+           sender_verify = (current_from == sp.sender)
+           if self.config.allow_self_transfer:
+               sender_verify |= (sp.sender == sp.self_address)
+           if self.config.support_operator and self.config.operator_for_all:
+               sender_verify |= self.is_operator_for_all_of(current_from, sp.sender)
+           is_owner = sp.local("is_owner", sender_verify)
            sp.for tx in transfer.txs:
                 if self.config.single_asset:
                     sp.verify(tx.token_id == 0, message = "single-asset: token-id <> 0")
 
-                # sender_verify = ((self.is_administrator(sp.sender)) |
-                #                 (current_from == sp.sender))
-                sender_verify = (current_from == sp.sender)
-                message = self.error_message.not_owner()
                 if self.config.support_operator:
-                    message = self.error_message.not_operator()
-                    sender_verify |= (self.operator_set.is_member(self.data.operators,
-                                                                  current_from,
-                                                                  sp.sender,
-                                                                  tx.token_id))
-                if self.config.allow_self_transfer:
-                    sender_verify |= (sp.sender == sp.self_address)
-                sp.verify(sender_verify, message = message)
-                sp.verify(
-                    self.data.token_metadata.contains(tx.token_id),
-                    message = self.error_message.token_undefined()
-                )
-                # If amount is 0 we do nothing now:
-                sp.if (tx.amount > 0):
-                    from_user = self.ledger_key.make(current_from, tx.token_id)
-                    sp.verify(
-                        (self.data.ledger[from_user].balance >= tx.amount),
-                        message = self.error_message.insufficient_balance())
-                    to_user = self.ledger_key.make(tx.to_, tx.token_id)
-                    self.data.ledger[from_user].balance = sp.as_nat(
-                        self.data.ledger[from_user].balance - tx.amount)
-                    sp.if self.data.ledger.contains(to_user):
-                        self.data.ledger[to_user].balance += tx.amount
-                    sp.else:
-                         self.data.ledger[to_user] = FA2.Ledger_value.make(tx.amount)
+                    sp.if ~ is_owner.value:
+                        sp.verify(
+                            self.operator_set.is_member(self.data.operators,
+                                                        current_from,
+                                                        sp.sender,
+                                                        tx.token_id),
+                            message = self.error_message.not_operator())
+                else:
+                    sp.verify(is_owner.value, message = self.error_message.not_owner())
+                self.ledger_transfer(current_from, tx)
+
+    @sp.entry_point
+    def set_base_uri(self, params):
+        sp.set_type(params, sp.TRecord(base = sp.TNat, uri = sp.TBytes).layout(("base", "uri")))
+        sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
+        if self.config.base_uri:
+            sp.verify(~ self.data.base_uris.contains(params.base), message = "BASE_URI_ALREADY_SET")
+            self.data.base_uris[params.base] = params.uri
+        else:
+            sp.failwith("BASE_URI_UNSUPPORTED")
+
+    @sp.entry_point
+    def balance_of(self, params):
+        # paused may mean that balances are sensitive
+        self.verify_not_paused()
+        sp.set_type(params, FA2.Balance_of.entry_point_type())
+        def f_process_request(req):
+            sp.verify(self.data.token_metadata.contains(req.token_id), message = self.error_message.token_undefined())
+            request = sp.record(
+                owner = sp.set_type_expr(req.owner, sp.TAddress),
+                token_id = sp.set_type_expr(req.token_id, sp.TNat))
+            if self.config.nft_ledger:
+                sp.if self.data.ledger[req.token_id] == req.owner:
+                    sp.result(sp.record(request = request, balance = sp.nat(1)))
                 sp.else:
-                    pass
+                    sp.result(sp.record(request = request, balance = sp.nat(0)))
+            else:
+                user = self.ledger_key.make(req.owner, req.token_id)
+                sp.if self.data.ledger.contains(user):
+                    sp.result(sp.record(request = request, balance = self.data.ledger[user].balance))
+                sp.else:
+                    sp.result(sp.record(request = request, balance = sp.nat(0)))
+        res = sp.local("responses", params.requests.map(f_process_request))
+        destination = sp.set_type_expr(params.callback, sp.TContract(FA2.Balance_of.response_type()))
+        sp.transfer(res.value, sp.mutez(0), destination)
 
     @sp.entry_point
     def update_operators(self, params):
@@ -192,6 +620,32 @@ class DocumentNFT(FA2.FA2_change_metadata, FA2.FA2_token_metadata, FA2.FA2_mint,
         else:
             sp.failwith(self.error_message.operators_unsupported())
 
+    @sp.entry_point
+    def update_operators_for_all(self, params):
+        sp.set_type(params, sp.TList(
+            sp.TVariant(
+                add_operator = operator_for_all_type,
+                remove_operator = operator_for_all_type
+            ).layout(("add_operator", "remove_operator"))
+        ))
+        if self.config.support_operator and self.config.operator_for_all:
+            sp.for update in params:
+                with update.match_cases() as arg:
+                    with arg.match("add_operator") as upd:
+                        sp.verify(
+                            (upd.owner == sp.sender),
+                            message = self.error_message.not_operator()
+                        )
+                        self.data.operators_for_all[upd] = sp.unit
+                    with arg.match("remove_operator") as upd:
+                        sp.verify(
+                            (upd.owner == sp.sender),
+                            message = self.error_message.not_operator()
+                        )
+                        del self.data.operators_for_all[upd]
+        else:
+            sp.failwith("OPERATOR_FOR_ALL_UNSUPPORTED")
+
     @sp.offchain_view(pure = True)
     def total_token(self):
         """Get how many tokens are in this contract."""
@@ -201,10 +655,23 @@ class DocumentNFT(FA2.FA2_change_metadata, FA2.FA2_token_metadata, FA2.FA2_mint,
     def token_uri(self, tok):
         """Get URI of token by token ID."""
         sp.set_type(tok, sp.TNat)
-        metadata = self.data.token_metadata[tok]
-        uri = metadata.token_info
-        args = ""
-        sp.result(uri[args])
+        if self.config.base_uri:
+            token_info = sp.local("token_info", self.data.token_metadata[tok].token_info)
+            sp.result(self.token_full_uri(token_info.value))
+        else:
+            metadata = self.data.token_metadata[tok]
+            uri = metadata.token_info
+            args = ""
+            sp.result(uri[args])
+
+    @sp.offchain_view(pure = True)
+    def token_metadata(self, tok):
+        """Get TZIP-12 metadata of token by token ID."""
+        sp.set_type(tok, sp.TNat)
+        metadata = sp.local("metadata", self.data.token_metadata[tok])
+        if self.config.base_uri:
+            metadata.value.token_info[""] = self.token_full_uri(metadata.value.token_info)
+        sp.result(metadata.value)
     
     @sp.offchain_view(pure = True)
     def administrator(self):
@@ -223,35 +690,64 @@ class DocumentNFT(FA2.FA2_change_metadata, FA2.FA2_token_metadata, FA2.FA2_mint,
         sp.set_type(tok, sp.TNat)
         sp.result(self.data.token_metadata.contains(tok))
 
-    @sp.offchain_view(pure = True)
-    def is_operator(self, query):
-        """Ask sender is operator of token ID."""
-        sp.set_type(query,
-                    sp.TRecord(token_id = sp.TNat,
-                               owner = sp.TAddress,
-                               operator = sp.TAddress).layout(
-                                   ("owner", ("operator", "token_id"))))
-        sp.result(
-            self.operator_set.is_member(self.data.operators,
-                                        query.owner,
-                                        query.operator,
-                                        query.token_id)
-        )
+    def anchored_status(self, document):
+        status = sp.local("status", sp.set_type_expr(
+            sp.record(document = document, issued = sp.none, revoked = sp.none), document_status_type))
+        sp.if self.data.documents.contains(document):
+            record = sp.local("record", self.data.documents[document])
+            status.value = sp.record(document = document, issued = sp.some(record.value.issued), revoked = record.value.revoked)
+        return status.value
 
     @sp.offchain_view(pure = True)
     def is_owner(self, user):
         """Ask user is owner of token ID."""
-        # sp.set_type(user, sp.TPair)
-        sp.if self.data.ledger.contains(user):
-            sp.result(self.data.ledger[user].balance)
-        sp.else:
-            sp.result(0)
+        sp.set_type(user, sp.TPair(sp.TAddress, sp.TNat))
+        if self.config.nft_ledger:
+            sp.if self.data.ledger.get_opt(sp.snd(user)) == sp.some(sp.fst(user)):
+                sp.result(sp.nat(1))
+            sp.else:
+                sp.result(sp.nat(0))
+        else:
+            sp.if self.data.ledger.contains(user):
+                sp.result(self.data.ledger[user].balance)
+            sp.else:
+                sp.result(sp.nat(0))
     
 sp.add_compilation_target(
     "FA2_Non_Fungible_Token",
     DocumentNFT(
         admin   = FA2_admin,
-        config  = FA2.FA2_config(
+        config  = DocumentNFT_config(
+            non_fungible = True, 
+            use_token_metadata_offchain_view = True,
+            lazy_entry_points = True
+        ),
+        metadata = sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+)
+
+sp.add_compilation_target(
+    "FA2_Non_Fungible_Token_nft_ledger",
+    DocumentNFT(
+        admin   = FA2_admin,
+        config  = DocumentNFT_config(
+            non_fungible = True, 
+            use_token_metadata_offchain_view = True,
+            nft_ledger = True
+        ),
+        metadata = sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+)
+
+sp.add_compilation_target(
+    "FA2_Non_Fungible_Token_eager",
+    DocumentNFT(
+        admin   = FA2_admin,
+        config  = DocumentNFT_config(
             non_fungible = True, 
             use_token_metadata_offchain_view = True
         ),
@@ -261,6 +757,16 @@ sp.add_compilation_target(
     )
 )
 
+sp.add_compilation_target(
+    "FA2_Non_Fungible_Token_certificate",
+    DocumentNFT(
+        admin   = FA2_admin,
+        config  = certificate_config(),
+        metadata = sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+)
 
 @sp.add_target(name="FA2 non-fungible tokens", kind="origination")
 def origin():
@@ -268,7 +774,7 @@ def origin():
     sc.table_of_contents()
 
     documentNFT = DocumentNFT(
-        FA2.FA2_config(
+        DocumentNFT_config(
             non_fungible = True, 
             use_token_metadata_offchain_view = True
         ),
@@ -298,7 +804,7 @@ def test():
     sc.table_of_contents()
 
     documentNFT = DocumentNFT(
-        FA2.FA2_config(
+        DocumentNFT_config(
             non_fungible = True,
             use_token_metadata_offchain_view= True
         ),
@@ -413,6 +919,442 @@ def test():
     # check total_token
     sc.verify(documentNFT.total_token() == 4)
 
+# The other ledger layouts and lazy entry points must behave the same.
+def add_layout_test(config, name):
+    @sp.add_test(name=name)
+    def test():
+        admin = sp.test_account("Admin")
+        user1 = sp.test_account("User1")
+        user2 = sp.test_account("User2")
+        operatorUser1 = sp.test_account("OperatorUser1")
+
+        # init
+        sc = sp.test_scenario()
+        sc.table_of_contents()
+
+        documentNFT = DocumentNFT(
+            config,
+            admin= admin.address,
+            metadata= sp.utils.metadata_of_url(
+                "https://gateway.pinata.cloud/ipfs/"
+            )
+        )
+        sc += documentNFT
+
+        # mint and mint_batch
+        bytes_metadata = sp.utils.bytes_of_string(
+            "ipfs://QmURZgvNk5svhpVx5pTtdCeNHvttCcE5vtKGooufNiqucN")
+        metadata = sp.map(l = {"" : bytes_metadata}, tkey = sp.TString, tvalue = sp.TBytes)
+        documentNFT.mint(
+            address = user1.address,
+            metadata = metadata
+            ).run(sender=admin.address)
+        documentNFT.mint_batch([
+            sp.record(address = user2.address, metadata = metadata),
+            sp.record(address = user2.address, metadata = metadata),
+            ]).run(sender=admin.address)
+
+        def single_transfer(from_, to_, token_id, amount):
+            return documentNFT.transfer([
+                    documentNFT.batch_transfer.item(from_ = from_,
+                                        txs = [
+                                            sp.record(to_ = to_,
+                                                        amount = amount,
+                                                        token_id = token_id)])
+                ])
+
+        # transfer : from owner, then from operator
+        single_transfer(user2.address, user1.address, 2, 1).run(sender=user2.address)
+        documentNFT.update_operators([
+                sp.variant("add_operator", documentNFT.operator_param.make(
+                    owner = user1.address,
+                    operator = operatorUser1.address,
+                    token_id = 0))
+            ]).run(sender=user1.address)
+        single_transfer(user1.address, user2.address, 0, 1).run(sender=operatorUser1.address)
+
+        # unknown tokens fail, zero amounts of known tokens pass
+        single_transfer(user1.address, user2.address, 9, 1).run(sender=user1.address, valid=False)
+        single_transfer(user1.address, user2.address, 9, 0).run(sender=user1.address, valid=False)
+        single_transfer(user1.address, user2.address, 0, 0).run(sender=user1.address)
+        single_transfer(user1.address, user2.address, 0, 1).run(sender=user1.address, valid=False)
+
+        # check is_owner
+        sc.verify(documentNFT.is_owner(sp.pair(user1.address, 0)) == 0)
+        sc.verify(documentNFT.is_owner(sp.pair(user2.address, 0)) == 1)
+        sc.verify(documentNFT.is_owner(sp.pair(user1.address, 2)) == 1)
+        sc.verify(documentNFT.is_owner(sp.pair(user2.address, 2)) == 0)
+        sc.verify(documentNFT.total_token() == 3)
+
+add_layout_test(
+    DocumentNFT_config(
+        non_fungible = True,
+        use_token_metadata_offchain_view = True,
+        nft_ledger = True
+    ),
+    name = "test nft_ledger layout"
+)
+add_layout_test(
+    DocumentNFT_config(
+        non_fungible = True,
+        use_token_metadata_offchain_view = True,
+        lazy_entry_points = True
+    ),
+    name = "test lazy entry points"
+)
+
+
+@sp.add_test(name="test base uri")
+def test():
+    admin = sp.test_account("Admin")
+    user1 = sp.test_account("User1")
+
+    # init
+    sc = sp.test_scenario()
+    sc.table_of_contents()
+
+    documentNFT = DocumentNFT(
+        DocumentNFT_config(
+            non_fungible = True,
+            use_token_metadata_offchain_view= True,
+            base_uri = True
+        ),
+        admin= admin.address,
+        metadata= sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+    sc += documentNFT
+
+    # collection base (0) and a cohort directory (1)
+    collection_uri = sp.utils.bytes_of_string("ipfs://")
+    cohort_uri = sp.utils.bytes_of_string("ipfs://QmURZgvNk5svhpVx5pTtdCeNHvttCcE5vtKGooufNiqucN/")
+    documentNFT.set_base_uri(base = 0, uri = collection_uri).run(sender=user1.address, valid=False)
+    documentNFT.set_base_uri(base = 0, uri = collection_uri).run(sender=admin.address)
+    documentNFT.set_base_uri(base = 1, uri = cohort_uri).run(sender=admin.address)
+    # bases are write-once, so the URIs of issued tokens cannot change
+    documentNFT.set_base_uri(base = 1, uri = collection_uri).run(sender=admin.address, valid=False)
+
+    # mint with a CID on the collection base
+    cid = sp.utils.bytes_of_string("QmXe4VXeZGuwbPvWxZYuUVRPjbysGzJUNE8Y6UuVzP6QP4")
+    documentNFT.mint(
+        address = user1.address,
+        metadata = sp.map(l = {"" : cid}, tkey = sp.TString, tvalue = sp.TBytes)
+        ).run(sender=admin.address)
+
+    # mint_batch with file names in the cohort directory
+    def cohort_metadata(name):
+        return sp.map(l = {
+            "" : sp.utils.bytes_of_string(name),
+            "base" : sp.pack(sp.nat(1))
+        }, tkey = sp.TString, tvalue = sp.TBytes)
+    documentNFT.mint_batch([
+        sp.record(address = user1.address, metadata = cohort_metadata("1.json")),
+        sp.record(address = user1.address, metadata = cohort_metadata("2.json")),
+        ]).run(sender=admin.address)
+
+    # tokens cannot use a base that is not set yet
+    documentNFT.mint(
+        address = user1.address,
+        metadata = sp.map(l = {"" : cid, "base" : sp.pack(sp.nat(2))}, tkey = sp.TString, tvalue = sp.TBytes)
+        ).run(sender=admin.address, valid=False)
+
+    # views rebuild the full URI
+    sc.verify(documentNFT.token_uri(0) == collection_uri + cid)
+    sc.verify(documentNFT.token_uri(2) == cohort_uri + sp.utils.bytes_of_string("2.json"))
+    sc.verify(documentNFT.token_metadata(1).token_info[""] == cohort_uri + sp.utils.bytes_of_string("1.json"))
+    sc.verify(documentNFT.token_metadata(1).token_id == 1)
+
+@sp.add_test(name="test merkle claim")
+def test():
+    admin = sp.test_account("Admin")
+    user1 = sp.test_account("User1")
+    user2 = sp.test_account("User2")
+    relayer = sp.test_account("Relayer")
+
+    # init
+    sc = sp.test_scenario()
+    sc.table_of_contents()
+
+    documentNFT = DocumentNFT(
+        DocumentNFT_config(
+            non_fungible = True,
+            use_token_metadata_offchain_view= True,
+            merkle_claim = True
+        ),
+        admin= admin.address,
+        metadata= sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+    sc += documentNFT
+
+    # cohort of two: root = blake2b(leaf1 + leaf2)
+    def cohort_metadata(name):
+        return sp.map(l = {"" : sp.utils.bytes_of_string(name)}, tkey = sp.TString, tvalue = sp.TBytes)
+    token1 = sp.record(address = user1.address, metadata = cohort_metadata("ipfs://1.json"))
+    token2 = sp.record(address = user2.address, metadata = cohort_metadata("ipfs://2.json"))
+    leaf1 = sp.blake2b(sp.pack(sp.set_type_expr(token1, mint_params_type)))
+    leaf2 = sp.blake2b(sp.pack(sp.set_type_expr(token2, mint_params_type)))
+    root = sp.blake2b(leaf1 + leaf2)
+
+    # one admin operation per cohort
+    documentNFT.add_claim_root(root).run(sender=user1.address, valid=False)
+    documentNFT.add_claim_root(root).run(sender=admin.address)
+
+    # the recipient mints with its proof
+    documentNFT.mint_with_proof(
+        address = user1.address,
+        metadata = token1.metadata,
+        proof = [sp.variant("right", leaf2)]
+        ).run(sender=user1.address)
+    sc.verify(documentNFT.is_owner(sp.pair(user1.address, 0)) == 1)
+    sc.verify(documentNFT.is_claimed(token1))
+    sc.verify(~documentNFT.is_claimed(token2))
+
+    # a relayer mints for the other recipient
+    documentNFT.mint_with_proof(
+        address = user2.address,
+        metadata = token2.metadata,
+        proof = [sp.variant("left", leaf1)]
+        ).run(sender=relayer.address)
+    sc.verify(documentNFT.is_owner(sp.pair(user2.address, 1)) == 1)
+    sc.verify(documentNFT.token_uri(1) == sp.utils.bytes_of_string("ipfs://2.json"))
+
+    # double claims are rejected
+    documentNFT.mint_with_proof(
+        address = user1.address,
+        metadata = token1.metadata,
+        proof = [sp.variant("right", leaf2)]
+        ).run(sender=relayer.address, valid=False)
+
+    # proofs bind the recipient
+    documentNFT.mint_with_proof(
+        address = relayer.address,
+        metadata = token1.metadata,
+        proof = [sp.variant("right", leaf2)]
+        ).run(sender=relayer.address, valid=False)
+    sc.verify(documentNFT.total_token() == 2)
+
+@sp.add_test(name="test operator for all")
+def test():
+    admin = sp.test_account("Admin")
+    student = sp.test_account("Student")
+    custodian = sp.test_account("Custodian")
+    user = sp.test_account("User")
+
+    # init
+    sc = sp.test_scenario()
+    sc.table_of_contents()
+
+    documentNFT = DocumentNFT(
+        DocumentNFT_config(
+            non_fungible = True,
+            use_token_metadata_offchain_view= True,
+            nft_ledger = True,
+            operator_for_all = True
+        ),
+        admin= admin.address,
+        metadata= sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+    sc += documentNFT
+
+    metadata = sp.map(l = {"" : sp.utils.bytes_of_string("ipfs://1.json")}, tkey = sp.TString, tvalue = sp.TBytes)
+    documentNFT.mint_batch([
+        sp.record(address = student.address, metadata = metadata),
+        sp.record(address = student.address, metadata = metadata),
+        sp.record(address = user.address, metadata = metadata),
+        ]).run(sender=admin.address)
+
+    # one entry approves the custodian for every token of the student
+    approval = sp.record(owner = student.address, operator = custodian.address)
+    documentNFT.update_operators_for_all([sp.variant("add_operator", approval)]).run(sender=custodian.address, valid=False)
+    documentNFT.update_operators_for_all([sp.variant("add_operator", approval)]).run(sender=student.address)
+    sc.verify(documentNFT.is_operator_for_all(approval))
+    sc.verify(documentNFT.is_operator(sp.record(owner = student.address, operator = custodian.address, token_id = 1)))
+
+    def transfer(from_, token_ids):
+        return documentNFT.transfer([
+            documentNFT.batch_transfer.item(from_ = from_,
+                txs = [sp.record(to_ = custodian.address, amount = 1, token_id = token_id) for token_id in token_ids])
+        ])
+    transfer(student.address, [0, 1]).run(sender=custodian.address)
+    sc.verify(documentNFT.is_owner(sp.pair(custodian.address, 1)) == 1)
+    # but not for tokens of other owners
+    transfer(user.address, [2]).run(sender=custodian.address, valid=False)
+
+    # per-token approvals keep working next to it
+    documentNFT.update_operators([
+        sp.variant("add_operator", documentNFT.operator_param.make(
+            owner = user.address, operator = custodian.address, token_id = 2))
+        ]).run(sender=user.address)
+    transfer(user.address, [2]).run(sender=custodian.address)
+
+    # revoking the approval
+    documentNFT.update_operators_for_all([sp.variant("remove_operator", approval)]).run(sender=student.address)
+    sc.verify(~ documentNFT.is_operator_for_all(approval))
+    documentNFT.mint(address = student.address, metadata = metadata).run(sender=admin.address)
+    transfer(student.address, [3]).run(sender=custodian.address, valid=False)
+
+@sp.add_test(name="test owner index")
+def test():
+    admin = sp.test_account("Admin")
+    user1 = sp.test_account("User1")
+    user2 = sp.test_account("User2")
+
+    # init
+    sc = sp.test_scenario()
+    sc.table_of_contents()
+
+    documentNFT = DocumentNFT(
+        DocumentNFT_config(
+            non_fungible = True,
+            use_token_metadata_offchain_view= True,
+            nft_ledger = True,
+            owner_index = True
+        ),
+        admin= admin.address,
+        metadata= sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+    sc += documentNFT
+
+    metadata = sp.map(l = {"" : sp.utils.bytes_of_string("ipfs://1.json")}, tkey = sp.TString, tvalue = sp.TBytes)
+    documentNFT.mint_batch([sp.record(address = user1.address, metadata = metadata)] * 4).run(sender=admin.address)
+
+    def page(owner, offset, limit):
+        return documentNFT.tokens_of_owner(sp.record(owner = owner, offset = offset, limit = limit))
+    sc.verify_equal(page(user1.address, 0, 10), sp.record(total = 4, token_ids = [0, 1, 2, 3]))
+    sc.verify_equal(page(user1.address, 1, 2), sp.record(total = 4, token_ids = [1, 2]))
+    sc.verify_equal(page(user1.address, 5, 2), sp.record(total = 4, token_ids = []))
+
+    # a transfer moves the last token of the sender into the freed slot
+    documentNFT.transfer([
+        documentNFT.batch_transfer.item(from_ = user1.address,
+            txs = [sp.record(to_ = user2.address, amount = 1, token_id = 1)])
+        ]).run(sender=user1.address)
+    sc.verify_equal(page(user1.address, 0, 10), sp.record(total = 3, token_ids = [0, 3, 2]))
+    sc.verify_equal(page(user2.address, 0, 10), sp.record(total = 1, token_ids = [1]))
+
+    # claim maintains it as well, down to an empty index
+    documentNFT.claim([
+        documentNFT.batch_transfer.item(from_ = user2.address,
+            txs = [sp.record(to_ = user1.address, amount = 1, token_id = 1)])
+        ]).run(sender=admin.address)
+    sc.verify_equal(page(user2.address, 0, 10), sp.record(total = 0, token_ids = []))
+    sc.verify_equal(page(user1.address, 3, 10), sp.record(total = 4, token_ids = [1]))
+
+@sp.add_test(name="test issue and mint")
+def test():
+    admin = sp.test_account("Admin")
+    user1 = sp.test_account("User1")
+
+    # init
+    sc = sp.test_scenario()
+    sc.table_of_contents()
+
+    documentNFT = DocumentNFT(
+        DocumentNFT_config(
+            non_fungible = True,
+            use_token_metadata_offchain_view= True,
+            nft_ledger = True,
+            anchor_documents = True
+        ),
+        admin= admin.address,
+        metadata= sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+    sc += documentNFT
+
+    document = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    metadata = sp.map(l = {"" : sp.utils.bytes_of_string("ipfs://1.json")}, tkey = sp.TString, tvalue = sp.TBytes)
+    def issue_and_mint(document):
+        return documentNFT.issue_and_mint(document = document, address = user1.address, metadata = metadata)
+
+    # one operation anchors the hash and mints its certificate
+    issue_and_mint(document).run(sender=user1.address, valid=False)
+    issue_and_mint(document).run(sender=admin.address, level=1234)
+    sc.verify(documentNFT.is_owner(sp.pair(user1.address, 0)) == 1)
+    sc.verify_equal(
+        documentNFT.token_document_status(0),
+        sp.record(document = document, issued = sp.some(1234), revoked = sp.none))
+    issue_and_mint(document).run(sender=admin.address, valid=False)
+
+    # revocation shows through the token
+    documentNFT.revoke_document(document).run(sender=user1.address, valid=False)
+    documentNFT.revoke_document(document).run(sender=admin.address, level=1240)
+    documentNFT.revoke_document(document).run(sender=admin.address, valid=False)
+    sc.verify_equal(
+        documentNFT.token_document_status(0),
+        sp.record(document = document, issued = sp.some(1234), revoked = sp.some(1240)))
+
+    # neither anchoring nor revoking while paused
+    document2 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+    issue_and_mint(document2).run(sender=admin.address, level=1250)
+    documentNFT.set_pause(True).run(sender=admin.address)
+    documentNFT.revoke_document(document2).run(sender=admin.address, valid=False)
+    documentNFT.set_pause(False).run(sender=admin.address)
+    documentNFT.revoke_document(document2).run(sender=admin.address, level=1260)
+
+    # plain mints have no document
+    documentNFT.mint(address = user1.address, metadata = metadata).run(sender=admin.address)
+    sc.verify_equal(
+        documentNFT.document_status(sp.bytes("0x00")),
+        sp.record(document = sp.bytes("0x00"), issued = sp.none, revoked = sp.none))
+
+@sp.add_test(name="test certificate")
+def test():
+    admin = sp.test_account("Admin")
+    user1 = sp.test_account("User1")
+    user2 = sp.test_account("User2")
+
+    # init
+    sc = sp.test_scenario()
+    sc.table_of_contents()
+
+    documentNFT = DocumentNFT(
+        certificate_config(),
+        admin= admin.address,
+        metadata= sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+    sc += documentNFT
+
+    metadata = sp.map(l = {"" : sp.utils.bytes_of_string("ipfs://1.json")}, tkey = sp.TString, tvalue = sp.TBytes)
+    documentNFT.mint(address = user1.address, metadata = metadata).run(sender=user1.address, valid=False)
+    documentNFT.mint(address = user1.address, metadata = metadata).run(sender=admin.address)
+    documentNFT.mint_batch([
+        sp.record(address = user1.address, metadata = metadata),
+        sp.record(address = user2.address, metadata = metadata),
+        ]).run(sender=admin.address)
+    sc.verify(documentNFT.total_token() == 3)
+    sc.verify(documentNFT.is_owner(sp.pair(user1.address, 1)) == 1)
+
+    # owners transfer, nobody else does: there are no operators
+    def transfer(from_, to_, token_id):
+        return documentNFT.transfer([
+            documentNFT.batch_transfer.item(from_ = from_,
+                txs = [sp.record(to_ = to_, amount = 1, token_id = token_id)])
+        ])
+    transfer(user1.address, user2.address, 0).run(sender=user2.address, valid=False)
+    transfer(user1.address, user2.address, 0).run(sender=user1.address)
+    sc.verify(documentNFT.is_owner(sp.pair(user2.address, 0)) == 1)
+    documentNFT.update_operators([
+        sp.variant("add_operator", documentNFT.operator_param.make(
+            owner = user2.address, operator = user1.address, token_id = 0))
+        ]).run(sender=user2.address, valid=False)
+
+    # the admin can still move certificates
+    documentNFT.claim([
+        documentNFT.batch_transfer.item(from_ = user2.address,
+            txs = [sp.record(to_ = user1.address, amount = 1, token_id = 2)])
+        ]).run(sender=admin.address)
+    sc.verify(documentNFT.is_owner(sp.pair(user1.address, 2)) == 1)
 
 @sp.add_test(name="test admin")
 def test():
@@ -428,7 +1370,7 @@ def test():
     sc.table_of_contents()
 
     documentNFT = DocumentNFT(
-        FA2.FA2_config(
+        DocumentNFT_config(
             non_fungible = True,
             use_token_metadata_offchain_view= True
         ),
@@ -505,3 +1447,129 @@ def test():
  
 
 
+@sp.add_test(name="test operation packer")
+def test():
+    # mint_batch batches of the packer mint in queue order, and its
+    # parameter sizes match the Micheline encoding. Run from this directory.
+    packer = sp.io.import_script_from_url("file:operationPacker.py")
+    admin = sp.test_account("Admin")
+
+    sc = sp.test_scenario()
+    documentNFT = DocumentNFT(
+        certificate_config(),
+        admin= admin.address,
+        metadata= sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+    sc += documentNFT
+
+    address = "tz1NXLfpxJ2bF7ehyvwQN69AUZh8FCGPgjmn"
+    queue = [dict(address = address, metadata = {"": ("ipfs://%d.json" % i).encode()}) for i in range(30)]
+    model = packer.CostModel("mint_batch", gas = (20000, 4000, 10), storage = (0, 200, 1))
+    mints = packer.Packer(model, limits = dict(size = 1000), margin = 0)
+    token_id = 0
+    for batch in mints.pack(queue):
+        params = [
+            sp.record(address = sp.address(m["address"]), metadata = {k: sp.bytes("0x" + v.hex()) for k, v in m["metadata"].items()})
+            for m in batch
+        ]
+        params = sp.set_type_expr(params, sp.TList(mint_params_type))
+        estimate = mints.estimate(batch)
+        assert estimate["size"] <= 1000
+        parameterSize = estimate["size"] - packer.OPERATION_SIZE - packer.TRANSACTION_SIZE - len("mint_batch")
+        # packed data starts with one 0x05 byte
+        sc.verify_equal(sp.len(sp.pack(params)), parameterSize + 1)
+        documentNFT.mint_batch(params).run(sender=admin.address)
+        for m in batch:
+            sc.verify(documentNFT.token_uri(token_id) == sp.bytes("0x" + m["metadata"][""].hex()))
+            token_id += 1
+    sc.verify(documentNFT.total_token() == len(queue))
+
+@sp.add_test(name="test replica")
+def test():
+    # The pure-Python replica must agree with the contract on every view
+    # after the same operation log. Run from this directory.
+    replica = sp.io.import_script_from_url("file:documentReplica.py")
+
+    admin = "tz1NXLfpxJ2bF7ehyvwQN69AUZh8FCGPgjmn"
+    user1 = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+    user2 = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+    users = [admin, user1, user2]
+
+    sc = sp.test_scenario()
+    sc.table_of_contents()
+
+    documentNFT = DocumentNFT(
+        DocumentNFT_config(
+            non_fungible = True,
+            use_token_metadata_offchain_view= True,
+            nft_ledger = True
+        ),
+        admin= sp.address(admin),
+        metadata= sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+    sc += documentNFT
+    documentReplica = replica.DocumentNFTReplica(admin)
+
+    def apply(level, sender, entrypoint, parameter, smartpyParameter):
+        valid = True
+        try:
+            documentReplica.apply(dict(level = level, sender = sender, entrypoint = entrypoint, parameter = parameter))
+        except replica.ReplicaError:
+            valid = False
+        getattr(documentNFT, entrypoint)(smartpyParameter).run(sender = sp.address(sender), level = level, valid = valid)
+
+    def mint(address, uri):
+        return (
+            dict(address = address, metadata = {"": uri.encode()}),
+            sp.record(
+                address = sp.address(address),
+                metadata = sp.map(l = {"" : sp.utils.bytes_of_string(uri)}, tkey = sp.TString, tvalue = sp.TBytes)
+            )
+        )
+
+    def transfer(from_, to_, token_id):
+        return (
+            [dict(from_ = from_, txs = [dict(to_ = to_, token_id = token_id, amount = 1)])],
+            [documentNFT.batch_transfer.item(from_ = sp.address(from_),
+                txs = [sp.record(to_ = sp.address(to_), amount = 1, token_id = token_id)])]
+        )
+
+    def operator(case, owner, operator, token_id):
+        return (
+            [{case: dict(owner = owner, operator = operator, token_id = token_id)}],
+            [sp.variant(case, documentNFT.operator_param.make(
+                owner = sp.address(owner), operator = sp.address(operator), token_id = token_id))]
+        )
+
+    apply(10, user1, "mint", *mint(user1, "ipfs://0.json"))
+    apply(10, admin, "mint", *mint(user1, "ipfs://0.json"))
+    token1, smartpyToken1 = mint(user1, "ipfs://1.json")
+    token2, smartpyToken2 = mint(user2, "ipfs://2.json")
+    apply(11, admin, "mint_batch", [token1, token2], [smartpyToken1, smartpyToken2])
+    apply(12, user2, "transfer", *transfer(user1, user2, 0))
+    apply(12, user1, "transfer", *transfer(user1, user2, 0))
+    apply(13, user1, "transfer", *transfer(user1, user2, 0))
+    apply(13, user1, "update_operators", *operator("add_operator", user2, user1, 2))
+    apply(14, user2, "update_operators", *operator("add_operator", user2, user1, 2))
+    apply(15, user1, "transfer", *transfer(user2, admin, 2))
+    apply(16, user1, "transfer", *transfer(user1, user2, 3))
+    apply(17, admin, "claim", *transfer(admin, user1, 2))
+    apply(18, user2, "update_operators", *operator("remove_operator", user2, user1, 2))
+    apply(19, admin, "set_pause", True, True)
+    apply(20, user2, "transfer", *transfer(user2, user1, 0))
+
+    sc.verify(documentNFT.total_token() == documentReplica.view("total_token"))
+    sc.verify(documentNFT.administrator() == sp.address(documentReplica.view("administrator")))
+    for token_id in range(4):
+        sc.verify(documentNFT.does_token_exist(token_id) == documentReplica.view("does_token_exist", token_id))
+        for user in users:
+            sc.verify(documentNFT.is_owner(sp.pair(sp.address(user), token_id)) == documentReplica.view("is_owner", (user, token_id)))
+    for token_id in range(3):
+        sc.verify(documentNFT.token_uri(token_id) == sp.bytes("0x" + documentReplica.view("token_uri", token_id).hex()))
+    query = dict(owner = user2, operator = user1, token_id = 2)
+    sc.verify(documentNFT.is_operator(sp.record(
+        owner = sp.address(user2), operator = sp.address(user1), token_id = 2)) == documentReplica.view("is_operator", query))
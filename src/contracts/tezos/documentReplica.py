@@ -0,0 +1,741 @@
+"""Pure-Python replicas of DocumentStore and DocumentNFT.
+
+A replica replays the operation log of one contract into in-memory indexes
+and answers its off-chain views locally, so verifiers do not need an RPC
+round-trip per view. Entry points follow the SmartPy sources: the same
+checks, in the same order, with the same error messages. An operation that
+fails leaves the replica untouched.
+
+Operations are dicts (or objects) with ``level``, ``sender``, ``entrypoint``
+and ``parameter``. Parameters use plain Python values the way indexers
+decode Michelson: bytes as ``bytes`` or hex strings, addresses as strings,
+records as dicts keyed by field name, variants as ``{"case": value}`` and
+unit as ``None``.
+
+Signatures and merkle proofs of ``permit`` and ``mint_with_proof`` are not
+re-checked: only applied operations end up in the log, so they were checked
+on chain already. The nonces and double-claim rules are still enforced.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+NULL_ADDRESS = "tz1Ke2h7sDdakHJQh8WX4Z372du1KChsksyU"
+LEAF_WORD_SIZE = 256
+
+
+class ReplicaError(Exception):
+    """An entry point failed or a view has no result, as it would on chain."""
+
+
+def to_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if value.startswith("0x"):
+        value = value[2:]
+    return bytes.fromhex(value)
+
+
+def variant(value):
+    """Split ``{"case": arg}`` (or a bare ``"case"`` for unit) in two."""
+    if isinstance(value, str):
+        return value, None
+    (case, arg), = value.items()
+    return case, arg
+
+
+# base58check and key hashing, to find the signer of a permit
+
+_B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# public key prefix -> (prefix length, implicit address prefix)
+_KEY_PREFIXES = {
+    "edpk": (4, b"\x06\xa1\x9f"),
+    "sppk": (4, b"\x06\xa1\xa1"),
+    "p2pk": (4, b"\x06\xa1\xa4"),
+}
+
+
+def _checksum(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()[:4]
+
+
+def _b58decode(string):
+    number = 0
+    for char in string:
+        number = number * 58 + _B58_ALPHABET.index(char)
+    data = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    data = b"\x00" * (len(string) - len(string.lstrip("1"))) + data
+    if _checksum(data[:-4]) != data[-4:]:
+        raise ReplicaError("Invalid base58 checksum")
+    return data[:-4]
+
+
+def _b58encode(data):
+    data = data + _checksum(data)
+    number = int.from_bytes(data, "big")
+    string = ""
+    while number:
+        number, digit = divmod(number, 58)
+        string = _B58_ALPHABET[digit] + string
+    return "1" * (len(data) - len(data.lstrip(b"\x00"))) + string
+
+
+def key_address(public_key):
+    """Implicit account address of a base58 public key."""
+    length, prefix = _KEY_PREFIXES[public_key[:4]]
+    key = _b58decode(public_key)[length:]
+    return _b58encode(prefix + hashlib.blake2b(key, digest_size = 20).digest())
+
+
+# keccak256, as used by OpenAttestation merkle trees (not hashlib's sha3)
+
+_KECCAK_ROUNDS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+_KECCAK_ROTATIONS = [
+    [0, 36, 3, 41, 18], [1, 44, 10, 45, 2], [62, 6, 43, 15, 61],
+    [28, 55, 25, 21, 56], [27, 20, 39, 8, 14],
+]
+_MASK = (1 << 64) - 1
+
+
+def _rotate(lane, shift):
+    return ((lane << shift) | (lane >> (64 - shift))) & _MASK if shift else lane
+
+
+def _keccak_f(state):
+    for round_constant in _KECCAK_ROUNDS:
+        c = [state[x][0] ^ state[x][1] ^ state[x][2] ^ state[x][3] ^ state[x][4] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rotate(c[(x + 1) % 5], 1) for x in range(5)]
+        state = [[state[x][y] ^ d[x] for y in range(5)] for x in range(5)]
+        b = [[0] * 5 for _ in range(5)]
+        for x in range(5):
+            for y in range(5):
+                b[y][(2 * x + 3 * y) % 5] = _rotate(state[x][y], _KECCAK_ROTATIONS[x][y])
+        state = [[b[x][y] ^ (~b[(x + 1) % 5][y] & b[(x + 2) % 5][y]) for y in range(5)] for x in range(5)]
+        state[0][0] ^= round_constant
+    return state
+
+
+def keccak256(data):
+    rate = 136
+    padded = bytearray(data) + b"\x01"
+    padded += b"\x00" * (-len(padded) % rate)
+    padded[-1] |= 0x80
+    state = [[0] * 5 for _ in range(5)]
+    for offset in range(0, len(padded), rate):
+        for lane in range(rate // 8):
+            start = offset + 8 * lane
+            state[lane % 5][lane // 5] ^= int.from_bytes(padded[start:start + 8], "little")
+        state = _keccak_f(state)
+    return b"".join(state[lane % 5][lane // 5].to_bytes(8, "little") for lane in range(4))
+
+
+def merkle_root(leaf, proof):
+    """OpenAttestation root: keccak256 of each sorted pair, as DocumentStore.merkleRoot."""
+    node = to_bytes(leaf)
+    for sibling in proof:
+        sibling = to_bytes(sibling)
+        node = keccak256(node + sibling if node < sibling else sibling + node)
+    return node
+
+
+class ViewCache:
+    """Bounded LRU of view results, tagged with the state they were read from.
+
+    An entry is only served while the replica is still at the same level and
+    has applied no operation since, so answers are never staler than the
+    replica itself.
+    """
+    def __init__(self, maxsize = 4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, state, compute):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == state:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = compute()
+        self.entries[key] = (state, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last = False)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class Replica:
+    """Operation replay, rollback on failure and cached views."""
+    def __init__(self, cache_size = 4096):
+        self.level = 0
+        self.mutations = 0
+        self.cache = ViewCache(cache_size)
+        self._journal = None
+
+    # writes go through the journal so that a failing operation is undone
+    def _put(self, table, key, value):
+        self._journal.append((table, key, table.get(key, _MISSING)))
+        table[key] = value
+
+    def _del(self, table, key):
+        self._journal.append((table, key, table.get(key, _MISSING)))
+        table.pop(key, None)
+
+    def _assign(self, name, value):
+        self._journal.append((self, name, getattr(self, name)))
+        setattr(self, name, value)
+
+    def _rollback(self):
+        for target, key, previous in reversed(self._journal):
+            if target is self:
+                setattr(self, key, previous)
+            elif previous is _MISSING:
+                target.pop(key, None)
+            else:
+                target[key] = previous
+
+    def apply(self, operation):
+        """Apply one operation; raises ReplicaError and changes nothing if it fails."""
+        get = operation.get if isinstance(operation, dict) else lambda name: getattr(operation, name)
+        level = get("level")
+        if level < self.level:
+            raise ReplicaError("Operations must be applied in level order")
+        entrypoint = getattr(self, "ep_" + get("entrypoint"), None)
+        if entrypoint is None:
+            raise ReplicaError("Unknown entry point " + get("entrypoint"))
+        self._journal = []
+        try:
+            # entry points read the level; journaled so a failure restores it
+            self._assign("level", level)
+            entrypoint(get("sender"), get("parameter"))
+        except Exception:
+            self._rollback()
+            raise
+        finally:
+            self._journal = None
+        self.mutations += 1
+
+    def replay(self, operations):
+        for operation in operations:
+            self.apply(operation)
+
+    def view(self, name, *args):
+        """Answer an off-chain view, through the cache."""
+        key = (name, _freeze(args))
+        return self.cache.get(key, (self.level, self.mutations), lambda: getattr(self, name)(*args))
+
+
+_MISSING = object()
+
+
+class DocumentStoreReplica(Replica):
+    """Replica of DocumentStore (and DocumentStoreUnified, which behaves the same)."""
+    def __init__(self, owner, change_log = False, cache_size = 4096):
+        Replica.__init__(self, cache_size)
+        self.owner_ = owner
+        self.change_log = change_log
+        # sequence number -> change, in level order
+        self.changes = {}
+        self.changeCount = 0
+        self.issuers = {}
+        self.permitNonces = {}
+        self.epochIssued = {}
+        self.revokedLeaves = {}
+        # document -> (issued level or None, revoked level or None)
+        self.documents = {}
+
+    def _authorized(self, address):
+        return address == self.owner_ or address in self.issuers
+
+    def _only_owner(self, sender):
+        if sender != self.owner_:
+            raise ReplicaError("Invalid Owner")
+
+    def _only_issuer(self, sender):
+        if not self._authorized(sender):
+            raise ReplicaError("Invalid Issuer")
+
+    def _issue(self, document, idempotent):
+        issued, revoked = self.documents.get(document, (None, None))
+        if issued is not None:
+            if not idempotent:
+                raise ReplicaError("Error: Only hashes that have not been issued can be issued")
+            return
+        self._put(self.documents, document, (self.level, revoked))
+        self._changed("issue", document)
+
+    def _revoke(self, document, idempotent):
+        issued, revoked = self.documents.get(document, (None, None))
+        if revoked is not None:
+            if not idempotent:
+                raise ReplicaError("Error: Hash has been revoked previously")
+            return
+        self._put(self.documents, document, (issued, self.level))
+        self._changed("revoke", document)
+
+    def _changed(self, action, document):
+        if self.change_log:
+            self._put(self.changes, self.changeCount, {"document": document, "action": action, "level": self.level})
+            self._assign("changeCount", self.changeCount + 1)
+
+    def ep_transferOwnership(self, sender, newOwner):
+        self._only_owner(sender)
+        self._assign("owner_", newOwner)
+        for issuer in list(self.issuers):
+            self._del(self.issuers, issuer)
+
+    def ep_renounceOwnership(self, sender, _):
+        self._only_owner(sender)
+        self._assign("owner_", NULL_ADDRESS)
+        for issuer in list(self.issuers):
+            self._del(self.issuers, issuer)
+
+    def ep_addIssuer(self, sender, issuer):
+        self._only_owner(sender)
+        self._put(self.issuers, issuer, None)
+
+    def ep_removeIssuer(self, sender, issuer):
+        self._only_owner(sender)
+        self._del(self.issuers, issuer)
+
+    def ep_issue(self, sender, document):
+        self._only_issuer(sender)
+        self._issue(to_bytes(document), False)
+
+    def ep_revoke(self, sender, document):
+        self._only_issuer(sender)
+        self._revoke(to_bytes(document), False)
+
+    def ep_bulkIssue(self, sender, params):
+        self._only_issuer(sender)
+        for document in params["documents"]:
+            self._issue(to_bytes(document), params["idempotent"])
+
+    def ep_bulkRevoke(self, sender, params):
+        self._only_issuer(sender)
+        for document in params["documents"]:
+            self._revoke(to_bytes(document), params["idempotent"])
+
+    def ep_commitEpoch(self, sender, root):
+        self._only_issuer(sender)
+        root = to_bytes(root)
+        if root in self.epochIssued:
+            raise ReplicaError("Error: Epoch root has been committed previously")
+        self._put(self.epochIssued, root, self.level)
+        self._changed("commitEpoch", root)
+
+    def ep_revokeLeaves(self, sender, params):
+        self._only_issuer(sender)
+        root = to_bytes(params["root"])
+        for index in params["indices"]:
+            key = (root, index // LEAF_WORD_SIZE)
+            word = self.revokedLeaves.get(key, 0)
+            if not (word >> (index % LEAF_WORD_SIZE)) & 1:
+                self._put(self.revokedLeaves, key, word | (1 << (index % LEAF_WORD_SIZE)))
+                self._changed({"revokeLeaf": index}, root)
+
+    def ep_permit(self, sender, permits):
+        for permit in permits:
+            signer = key_address(permit["publicKey"])
+            if not self._authorized(signer):
+                raise ReplicaError("Invalid Issuer")
+            if permit["nonce"] != self.permitNonces.get(signer, 0):
+                raise ReplicaError("Error: Invalid permit nonce")
+            self._put(self.permitNonces, signer, permit["nonce"] + 1)
+            action, _ = variant(permit["action"])
+            if action == "issue":
+                self._issue(to_bytes(permit["document"]), False)
+            else:
+                self._revoke(to_bytes(permit["document"]), False)
+
+    # off-chain views
+
+    def _issued(self, document):
+        return self.documents.get(to_bytes(document), (None, None))[0]
+
+    def _revoked(self, document):
+        return self.documents.get(to_bytes(document), (None, None))[1]
+
+    def owner(self):
+        return self.owner_
+
+    def isIssuer(self, address):
+        return self._authorized(address)
+
+    def getIssuedBlock(self, document):
+        issued = self._issued(document)
+        if issued is None:
+            raise ReplicaError("Error: Only issued document hashes can be revoked")
+        return issued
+
+    def isIssued(self, document):
+        return self._issued(document) is not None
+
+    def isIssuedBefore(self, params):
+        issued = self._issued(params["document"])
+        return issued is not None and issued < params["blockNumber"]
+
+    def isRevoked(self, document):
+        return self._revoked(document) is not None
+
+    def isRevokedBefore(self, params):
+        revoked = self._revoked(params["document"])
+        return revoked is not None and revoked < params["blockNumber"]
+
+    def getDocumentStatus(self, documents):
+        return [
+            {"document": to_bytes(document), "issued": self._issued(document), "revoked": self._revoked(document)}
+            for document in documents
+        ]
+
+    def getPermitNonce(self, address):
+        return self.permitNonces.get(address, 0)
+
+    def getEpochIssuedBlock(self, params):
+        return self.epochIssued.get(merkle_root(params["document"], params["proof"]))
+
+    def isEpochIssuedBefore(self, params):
+        level = self.getEpochIssuedBlock(params)
+        return level is not None and level < params["blockNumber"]
+
+    def verifyDocument(self, params):
+        target, root = to_bytes(params["target"]), to_bytes(params["root"])
+        proofValid = merkle_root(target, params["proof"]) == root
+        rootIssued, rootRevoked = self.documents.get(root, (None, None))
+        if rootIssued is None:
+            rootIssued = self.epochIssued.get(root)
+        targetRevoked = self._revoked(target)
+        leafRevoked = self.isLeafRevoked({"root": root, "index": params["index"]})
+        return {
+            "proofValid": proofValid,
+            "rootIssued": rootIssued,
+            "rootRevoked": rootRevoked,
+            "targetRevoked": targetRevoked,
+            "leafRevoked": leafRevoked,
+            "valid": (proofValid and rootIssued is not None and rootRevoked is None
+                      and targetRevoked is None and not leafRevoked),
+        }
+
+    def changesSince(self, params):
+        first = next((i for i in range(self.changeCount) if self.changes[i]["level"] >= params["level"]), self.changeCount)
+        start = max(first, params["cursor"])
+        end = min(start + params["limit"], self.changeCount)
+        return {
+            "changes": [self.changes[i] for i in range(start, end)],
+            "cursor": max(start, end),
+            "changeCount": self.changeCount,
+        }
+
+    def isLeafRevoked(self, params):
+        word = self.revokedLeaves.get((to_bytes(params["root"]), params["index"] // LEAF_WORD_SIZE), 0)
+        return (word >> (params["index"] % LEAF_WORD_SIZE)) & 1 == 1
+
+
+class DocumentNFTReplica(Replica):
+    """Replica of DocumentNFT.
+
+    Every token has a supply of one, so both ledger layouts are indexed as
+    token_id -> owner; balances are derived from it.
+    """
+    def __init__(self, admin, support_operator = True, base_uri = False, merkle_claim = False,
+                 operator_for_all = False, owner_index = False, anchor_documents = False, cache_size = 4096):
+        Replica.__init__(self, cache_size)
+        self.support_operator = support_operator
+        self.operator_for_all = operator_for_all
+        self.owner_index = owner_index
+        self.anchor_documents = anchor_documents
+        self.base_uri = base_uri
+        self.merkle_claim = merkle_claim
+        self.administrator_ = admin
+        self.paused = False
+        self.all_tokens = 0
+        self.ledger = {}
+        self.token_info = {}
+        self.operators = {}
+        self.operators_for_all = {}
+        # same dense arrays as the contract, so pages come in the same order
+        self.owner_token_count = {}
+        self.owner_tokens = {}
+        self.token_index = {}
+        # document -> (issued level, revoked level or None), token -> document
+        self.documents = {}
+        self.token_document = {}
+        self.metadata = {}
+        self.base_uris = {}
+        self.claim_roots = {}
+        self.claimed = {}
+
+    def _only_admin(self, sender):
+        if sender != self.administrator_:
+            raise ReplicaError("FA2_NOT_ADMIN")
+
+    def _not_paused(self):
+        if self.paused:
+            raise ReplicaError("FA2_PAUSED")
+
+    def _index_add(self, owner, token_id):
+        index = self.owner_token_count.get(owner, 0)
+        self._put(self.owner_tokens, (owner, index), token_id)
+        self._put(self.token_index, token_id, index)
+        self._put(self.owner_token_count, owner, index + 1)
+
+    def _index_remove(self, owner, token_id):
+        index = self.token_index[token_id]
+        last = self.owner_token_count[owner] - 1
+        if index != last:
+            moved = self.owner_tokens[(owner, last)]
+            self._put(self.owner_tokens, (owner, index), moved)
+            self._put(self.token_index, moved, index)
+        self._del(self.owner_tokens, (owner, last))
+        if last == 0:
+            self._del(self.owner_token_count, owner)
+        else:
+            self._put(self.owner_token_count, owner, last)
+
+    def _mint(self, params):
+        token_id = self.all_tokens
+        if self.base_uri and self._base(params["metadata"]) not in self.base_uris:
+            raise ReplicaError("BASE_URI_UNDEFINED")
+        self._put(self.ledger, token_id, params["address"])
+        if self.owner_index:
+            self._index_add(params["address"], token_id)
+        self._put(self.token_info, token_id, {k: to_bytes(v) for k, v in params["metadata"].items()})
+        self._assign("all_tokens", token_id + 1)
+
+    def _transfer(self, from_, tx):
+        if tx["token_id"] not in self.token_info:
+            raise ReplicaError("FA2_TOKEN_UNDEFINED")
+        if tx["amount"] > 0:
+            if tx["amount"] > 1 or self.ledger[tx["token_id"]] != from_:
+                raise ReplicaError("FA2_INSUFFICIENT_BALANCE")
+            self._put(self.ledger, tx["token_id"], tx["to_"])
+            if self.owner_index:
+                self._index_remove(from_, tx["token_id"])
+                self._index_add(tx["to_"], tx["token_id"])
+
+    def ep_set_administrator(self, sender, admin):
+        self._only_admin(sender)
+        self._assign("administrator_", admin)
+
+    def ep_set_pause(self, sender, paused):
+        self._only_admin(sender)
+        self._assign("paused", paused)
+
+    def ep_set_metadata(self, sender, params):
+        self._only_admin(sender)
+        self._put(self.metadata, params["k"], to_bytes(params["v"]))
+
+    def ep_set_base_uri(self, sender, params):
+        self._only_admin(sender)
+        if not self.base_uri:
+            raise ReplicaError("BASE_URI_UNSUPPORTED")
+        if params["base"] in self.base_uris:
+            raise ReplicaError("BASE_URI_ALREADY_SET")
+        self._put(self.base_uris, params["base"], to_bytes(params["uri"]))
+
+    def ep_mint(self, sender, params):
+        self._only_admin(sender)
+        self._not_paused()
+        self._mint(params)
+
+    def ep_mint_batch(self, sender, params):
+        self._only_admin(sender)
+        self._not_paused()
+        for token in params:
+            self._mint(token)
+
+    def ep_issue_and_mint(self, sender, params):
+        self._only_admin(sender)
+        self._not_paused()
+        if not self.anchor_documents:
+            raise ReplicaError("ANCHOR_DOCUMENTS_UNSUPPORTED")
+        document = to_bytes(params["document"])
+        if document in self.documents:
+            raise ReplicaError("DOCUMENT_ALREADY_ISSUED")
+        self._put(self.documents, document, (self.level, None))
+        self._put(self.token_document, self.all_tokens, document)
+        self._mint(params)
+
+    def ep_revoke_document(self, sender, document):
+        self._only_admin(sender)
+        self._not_paused()
+        if not self.anchor_documents:
+            raise ReplicaError("ANCHOR_DOCUMENTS_UNSUPPORTED")
+        document = to_bytes(document)
+        if document not in self.documents:
+            raise ReplicaError("DOCUMENT_UNDEFINED")
+        issued, revoked = self.documents[document]
+        if revoked is not None:
+            raise ReplicaError("DOCUMENT_ALREADY_REVOKED")
+        self._put(self.documents, document, (issued, self.level))
+
+    def ep_add_claim_root(self, sender, root):
+        self._only_admin(sender)
+        if not self.merkle_claim:
+            raise ReplicaError("MERKLE_CLAIM_UNSUPPORTED")
+        self._put(self.claim_roots, to_bytes(root), None)
+
+    def ep_mint_with_proof(self, sender, params):
+        self._not_paused()
+        if not self.merkle_claim:
+            raise ReplicaError("MERKLE_CLAIM_UNSUPPORTED")
+        leaf = self._claim_key(params)
+        if leaf in self.claimed:
+            raise ReplicaError("ALREADY_CLAIMED")
+        self._put(self.claimed, leaf, None)
+        self._mint(params)
+
+    def ep_claim(self, sender, params):
+        self._only_admin(sender)
+        self._not_paused()
+        for transfer in params:
+            for tx in transfer["txs"]:
+                self._transfer(transfer["from_"], tx)
+
+    def ep_transfer(self, sender, params):
+        self._not_paused()
+        for transfer in params:
+            for tx in transfer["txs"]:
+                allowed = transfer["from_"] == sender
+                if self.support_operator:
+                    allowed = allowed or (transfer["from_"], sender) in self.operators_for_all
+                    allowed = allowed or (transfer["from_"], sender, tx["token_id"]) in self.operators
+                if not allowed:
+                    raise ReplicaError("FA2_NOT_OPERATOR" if self.support_operator else "FA2_NOT_OWNER")
+                self._transfer(transfer["from_"], tx)
+
+    def ep_update_operators(self, sender, params):
+        if not self.support_operator:
+            raise ReplicaError("FA2_OPERATORS_UNSUPPORTED")
+        for update in params:
+            case, arg = variant(update)
+            if arg["owner"] != sender:
+                raise ReplicaError("FA2_NOT_OPERATOR")
+            key = (arg["owner"], arg["operator"], arg["token_id"])
+            if case == "add_operator":
+                self._put(self.operators, key, None)
+            else:
+                self._del(self.operators, key)
+
+    def ep_update_operators_for_all(self, sender, params):
+        if not (self.support_operator and self.operator_for_all):
+            raise ReplicaError("OPERATOR_FOR_ALL_UNSUPPORTED")
+        for update in params:
+            case, arg = variant(update)
+            if arg["owner"] != sender:
+                raise ReplicaError("FA2_NOT_OPERATOR")
+            key = (arg["owner"], arg["operator"])
+            if case == "add_operator":
+                self._put(self.operators_for_all, key, None)
+            else:
+                self._del(self.operators_for_all, key)
+
+    def ep_balance_of(self, sender, params):
+        self._not_paused()
+        for request in params["requests"]:
+            if request["token_id"] not in self.token_info:
+                raise ReplicaError("FA2_TOKEN_UNDEFINED")
+
+    # off-chain views
+
+    def _claim_key(self, token):
+        return (token["address"], _freeze({k: to_bytes(v) for k, v in token["metadata"].items()}))
+
+    def _base(self, token_info):
+        return _unpack_nat(token_info["base"]) if "base" in token_info else 0
+
+    def _full_uri(self, token_info):
+        if not self.base_uri:
+            return token_info[""]
+        return self.base_uris.get(self._base(token_info), b"") + token_info[""]
+
+    def _token_info(self, tok):
+        if tok not in self.token_info:
+            raise ReplicaError("FA2_TOKEN_UNDEFINED")
+        return self.token_info[tok]
+
+    def total_token(self):
+        return self.all_tokens
+
+    def token_uri(self, tok):
+        return self._full_uri(self._token_info(tok))
+
+    def token_metadata(self, tok):
+        token_info = dict(self._token_info(tok))
+        if self.base_uri:
+            token_info[""] = self._full_uri(token_info)
+        return {"token_id": tok, "token_info": token_info}
+
+    def administrator(self):
+        return self.administrator_
+
+    def is_admin(self, sender):
+        return sender == self.administrator_
+
+    def does_token_exist(self, tok):
+        return tok in self.token_info
+
+    def is_operator(self, query):
+        return ((query["owner"], query["operator"], query["token_id"]) in self.operators
+            or (query["owner"], query["operator"]) in self.operators_for_all)
+
+    def document_status(self, document):
+        document = to_bytes(document)
+        issued, revoked = self.documents.get(document, (None, None))
+        return {"document": document, "issued": issued, "revoked": revoked}
+
+    def token_document_status(self, tok):
+        if tok not in self.token_document:
+            raise ReplicaError("FA2_TOKEN_UNDEFINED")
+        return self.document_status(self.token_document[tok])
+
+    def tokens_of_owner(self, params):
+        total = self.owner_token_count.get(params["owner"], 0)
+        end = min(params["offset"] + params["limit"], total)
+        return {
+            "total": total,
+            "token_ids": [self.owner_tokens[(params["owner"], i)] for i in range(params["offset"], end)],
+        }
+
+    def is_operator_for_all(self, query):
+        return (query["owner"], query["operator"]) in self.operators_for_all
+
+    def is_owner(self, user):
+        address, token_id = user
+        return 1 if self.ledger.get(token_id) == address else 0
+
+    def is_claimed(self, token):
+        return self._claim_key(token) in self.claimed
+
+
+def _unpack_nat(packed):
+    """Decode PACK of a nat: 0x05 0x00 followed by a zarith number."""
+    data = to_bytes(packed)
+    if data[:2] != b"\x05\x00":
+        raise ReplicaError("INVALID_BASE_URI")
+    value, shift = data[2] & 0x3f, 6
+    for byte in data[3:]:
+        value |= (byte & 0x7f) << shift
+        shift += 7
+    return value
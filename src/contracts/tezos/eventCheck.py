@@ -0,0 +1,108 @@
+"""Check the events emitted by the compiled contracts.
+
+SmartPy scenarios cannot read the events an entry point emits, so their
+tags and payloads are checked here on the receipts of an octez-client
+mockup, with the same compiled targets as benchmark.py:
+
+    python build.py && python eventCheck.py
+
+Each step calls one entry point and lists the events its receipt must
+contain, in order. Payloads are Michelson with {level} for the level of
+the operation and {bootstrap1}... for the mockup accounts.
+"""
+
+import argparse
+import os
+import re
+import sys
+
+from benchmark import COMPILED_OWNER, Mockup, document, read_target, token, transfers
+
+HASH = document(0, 1)
+ROOT = document(0, 2)
+
+STEPS = {
+    "DocumentStore": [
+        ("issue", HASH, [("issued", 'Pair %s (Pair {level} "{bootstrap1}")' % HASH)]),
+        ("revoke", HASH, [("revoked", 'Pair %s (Pair {level} "{bootstrap1}")' % HASH)]),
+        ("bulkIssue", "Pair { %s ; %s } True" % (HASH, ROOT), [("issued", 'Pair %s (Pair {level} "{bootstrap1}")' % ROOT)]),
+        ("commitEpoch", ROOT, [("epochCommitted", 'Pair %s (Pair {level} "{bootstrap1}")' % ROOT)]),
+        ("revokeLeaves", "Pair %s { 1 ; 300 }" % ROOT,
+            [("leavesRevoked", 'Pair %s (Pair { 1 ; 300 } (Pair {level} "{bootstrap1}"))' % ROOT)]),
+        ("transferOwnership", '"{bootstrap2}"',
+            [("ownershipTransferred", 'Pair "{bootstrap1}" (Pair "{bootstrap2}" {level})')]),
+    ],
+    "MultiTenantDocumentStore": [
+        ("registerIssuer", '"{bootstrap1}"', []),
+        ("issue", "Pair 0 %s" % HASH, [("issued", 'Pair 0 (Pair %s (Pair {level} "{bootstrap1}"))' % HASH)]),
+        ("bulkRevoke", "Pair 0 (Pair { %s } False)" % HASH,
+            [("revoked", 'Pair 0 (Pair %s (Pair {level} "{bootstrap1}"))' % HASH)]),
+    ],
+    "FA2_Non_Fungible_Token": [
+        ("mint", token("{bootstrap2}", 0), [("minted", 'Pair 0 (Pair "{bootstrap2}" (Pair {level} "{bootstrap1}"))')]),
+        ("claim", transfers("{bootstrap2}", "{bootstrap3}", [0]),
+            [("transferred", 'Pair 0 (Pair "{bootstrap2}" (Pair "{bootstrap3}" (Pair 1 (Pair {level} "{bootstrap1}"))))')]),
+    ],
+}
+
+EVENT = re.compile(r"Tag: (\S+)\s+Payload: (.*?)\s+This event was successfully applied", re.S)
+
+
+def events(receipt):
+    # payloads are printed wrapped in parentheses, over several lines
+    found = []
+    for tag, payload in EVENT.findall(receipt):
+        payload = " ".join(payload.split())
+        if payload.startswith("(") and payload.endswith(")"):
+            payload = payload[1:-1]
+        found.append((tag, payload))
+    return found
+
+
+def substitute(text, addresses):
+    # not str.format: Michelson sequences use braces too
+    for name, address in addresses.items():
+        text = text.replace("{%s}" % name, address)
+    return text
+
+
+def matches(payload, expected, addresses):
+    pattern = re.escape(substitute(expected, addresses)).replace(r"\{level\}", r"\d+")
+    return re.fullmatch(pattern, payload) is not None
+
+
+def check(mockup, contracts):
+    failures = []
+    addresses = mockup.addresses
+    for target, steps in STEPS.items():
+        code, storage = read_target(contracts, target)
+        contract = mockup.originate(target + "_events", code, storage.replace(COMPILED_OWNER, addresses["bootstrap1"]))
+        for entrypoint, arg, expected in steps:
+            arg = substitute(arg, addresses)
+            emitted = events(mockup.transfer(contract, "bootstrap1", entrypoint, arg))
+            ok = len(emitted) == len(expected) and all(
+                tag == expected_tag and matches(payload, expected_payload, addresses)
+                for (tag, payload), (expected_tag, expected_payload) in zip(emitted, expected))
+            if not ok:
+                failures.append("%s.%s: emitted %r, expected %r" % (target, entrypoint, emitted, expected))
+            print(target, entrypoint, "ok" if ok else "FAILED")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument("--contracts", default = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build"),
+        help = "SmartPy compile output directory")
+    parser.add_argument("--client", default = "octez-client")
+    parser.add_argument("--protocol", default = None, help = "mockup protocol hash (default: client's)")
+    args = parser.parse_args()
+
+    with Mockup(args.client, args.protocol) as mockup:
+        failures = check(mockup, args.contracts)
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""Pack pending issuances and mints into as few operations as possible.
+
+The backend used to send one ``issue`` or ``mint`` per operation. The bulk
+entry points (``bulkIssue``, ``bulkRevoke``, ``mint_batch``) take a list,
+so a queue of pending hashes or mint requests can instead be cut into
+batches, one call per operation, each staying under the protocol limits:
+
+- gas, from a cost model of the entry point;
+- paid storage, from the same cost model;
+- operation size, from the Micheline encoding of the parameter.
+
+Cost models are upper bounds ``fixed + per_item * n + per_byte * bytes``
+fitted on the benchmark report of the compiled contracts (see benchmark.py),
+where bytes is the metadata stored by a batch of mints: token URIs are
+paid for byte by byte, so a model fitted on short URIs alone would give
+too low a storage limit for real ones::
+
+    python benchmark.py
+    python operationPacker.py --report build/benchmark.json --target DocumentStore \\
+        --entrypoint bulkIssue queue.json
+
+The queue order is kept: documents are issued and tokens are minted (and
+numbered) in the order they were queued. Since the costs of a call only grow
+with its items, filling each batch greedily then gives the fewest batches.
+
+Items use the replica's plain values: hashes as ``bytes`` or hex strings,
+mint requests as ``{"address": "tz1...", "metadata": {"": b"ipfs://..."}}``.
+"""
+
+import argparse
+import json
+import sys
+
+# Limits of one manager operation since the Paris protocol; see
+# /chains/main/blocks/head/context/constants.
+LIMITS = {
+    "gas": 1040000,     # hard_gas_limit_per_operation
+    "storage": 60000,   # hard_storage_limit_per_operation, in bytes
+    "size": 32768,      # max_operation_data_length, in bytes
+}
+
+# Bytes of an operation around the parameter: branch and signature, then a
+# transaction with source, zarith fee/counter/limits at their largest,
+# amount, destination, entry point tag and parameter length.
+OPERATION_SIZE = 32 + 64
+TRANSACTION_SIZE = 1 + 21 + 10 + 10 + 5 + 5 + 1 + 22 + 1 + 2 + 4
+
+
+class PackError(Exception):
+    """An item cannot fit in an operation, even alone."""
+
+
+def to_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if value.startswith("0x"):
+        value = value[2:]
+    return bytes.fromhex(value)
+
+
+# Binary Micheline sizes
+
+PAIR_SIZE = 2           # Prim Pair with two arguments, no annotation
+BOOL_SIZE = 2           # Prim True / False
+SEQUENCE_SIZE = 5       # tag and length, then the elements
+ADDRESS_SIZE = 5 + 22   # addresses are packed as bytes
+
+
+def bytes_size(value):
+    return 5 + len(to_bytes(value))
+
+
+def string_size(value):
+    return 5 + len(value.encode())
+
+
+def document_size(document):
+    return bytes_size(document)
+
+
+def mint_size(params):
+    # Pair address { Elt key value ; ... }
+    entries = sum(PAIR_SIZE + string_size(k) + bytes_size(v) for k, v in params["metadata"].items())
+    return PAIR_SIZE + ADDRESS_SIZE + SEQUENCE_SIZE + entries
+
+
+def no_bytes(item):
+    # hashes all have the same size, their cost is in per_item
+    return 0
+
+
+def metadata_bytes(params):
+    return sum(len(k.encode()) + len(to_bytes(v)) for k, v in params["metadata"].items())
+
+
+# entry point -> (size of its parameter without items, size of one item,
+# bytes of one item for the per_byte term of the cost model)
+ENTRY_POINTS = {
+    # Pair { hash ; ... } idempotent
+    "bulkIssue": (PAIR_SIZE + SEQUENCE_SIZE + BOOL_SIZE, document_size, no_bytes),
+    "bulkRevoke": (PAIR_SIZE + SEQUENCE_SIZE + BOOL_SIZE, document_size, no_bytes),
+    # { Pair address metadata ; ... }
+    "mint_batch": (SEQUENCE_SIZE, mint_size, metadata_bytes),
+}
+
+
+def _upper_bound(points):
+    # Smallest slope that no pair of consecutive measures exceeds, then the
+    # smallest intercept that puts every measure under the line.
+    points = sorted(points)
+    per_item = max([0] + [(c2 - c1) / (n2 - n1) for (n1, c1), (n2, c2) in zip(points, points[1:])])
+    fixed = max(c - per_item * n for n, c in points)
+    return max(fixed, 0), per_item
+
+
+def _results(report, target, case):
+    # n -> result of <target>.<case>.<n>, without the sizes over the
+    # operation limit (no gas)
+    prefix = "%s.%s." % (target, case)
+    return {
+        int(key[len(prefix):]): result
+        for key, result in report.items()
+        if key.startswith(prefix) and result.get("gas") is not None
+    }
+
+
+class CostModel:
+    """Gas and paid storage of one call carrying n items of bytes in total,
+    as ``fixed + per_item * n + per_byte * bytes``."""
+    def __init__(self, entrypoint, gas, storage):
+        if entrypoint not in ENTRY_POINTS:
+            raise ValueError("No size model for entry point " + entrypoint)
+        self.entrypoint = entrypoint
+        self.gas_fixed, self.gas_per_item, self.gas_per_byte = (tuple(gas) + (0,))[:3]
+        self.storage_fixed, self.storage_per_item, self.storage_per_byte = (tuple(storage) + (0,))[:3]
+
+    @classmethod
+    def from_report(cls, report, target, case, entrypoint = None, long_case = None):
+        """Fit on the ``<target>.<case>.<n>`` results of a benchmark report.
+
+        At least two sizes are needed to separate the fixed cost from the
+        cost per item. With long_case, the same calls with longer items
+        (``item_bytes`` in the results), the cost per byte is the largest
+        increase per added byte at any size; it is taken out of the
+        results of case before fitting the rest.
+        """
+        short = _results(report, target, case)
+        if len(short) < 2:
+            raise ValueError("Need results for at least two sizes of %s.%s.N" % (target, case))
+        per_byte = {"gas": 0, "storage": 0}
+        short_bytes = 0
+        if long_case is not None:
+            long = _results(report, target, long_case)
+            sizes = sorted(set(short) & set(long))
+            if not sizes:
+                raise ValueError("Need results for the same sizes of %s and %s" % (case, long_case))
+            short_bytes = short[sizes[0]]["item_bytes"]
+            added = long[sizes[0]]["item_bytes"] - short_bytes
+            if added <= 0:
+                raise ValueError(long_case + " must have longer items than " + case)
+            for metric in per_byte:
+                per_byte[metric] = max([0] + [(long[n][metric] - short[n][metric]) / (n * added) for n in sizes])
+        def fit(metric):
+            points = [(n, r[metric] - per_byte[metric] * short_bytes * n) for n, r in short.items()]
+            return _upper_bound(points) + (per_byte[metric],)
+        return cls(entrypoint or case, gas = fit("gas"), storage = fit("storage"))
+
+    def gas(self, n, bytes = 0):
+        return self.gas_fixed + self.gas_per_item * n + self.gas_per_byte * bytes
+
+    def storage(self, n, bytes = 0):
+        return self.storage_fixed + self.storage_per_item * n + self.storage_per_byte * bytes
+
+
+class Packer:
+    """Cut a queue into batches that each fit in one operation.
+
+    margin is kept free under the gas and storage limits: the cost models
+    come from a benchmark, not from a simulation of the actual batch.
+    """
+    def __init__(self, model, limits = LIMITS, margin = 0.1):
+        self.model = model
+        self.limits = dict(LIMITS, **limits)
+        self.margin = margin
+        self.parameter_size, self.item_size, self.item_bytes = ENTRY_POINTS[model.entrypoint]
+
+    def estimate(self, batch):
+        """Gas, paid storage and operation size of one call with batch."""
+        bytes = sum(self.item_bytes(item) for item in batch)
+        return {
+            "gas": self.model.gas(len(batch), bytes),
+            "storage": self.model.storage(len(batch), bytes),
+            "size": OPERATION_SIZE + TRANSACTION_SIZE + len(self.model.entrypoint)
+                + self.parameter_size + sum(self.item_size(item) for item in batch),
+        }
+
+    def _fits(self, n, size, bytes):
+        return (self.model.gas(n, bytes) <= self.limits["gas"] * (1 - self.margin)
+            and self.model.storage(n, bytes) <= self.limits["storage"] * (1 - self.margin)
+            and size <= self.limits["size"])
+
+    def pack(self, items):
+        batches = []
+        batch = []
+        size = OPERATION_SIZE + TRANSACTION_SIZE + len(self.model.entrypoint) + self.parameter_size
+        empty = size
+        bytes = 0
+        for item in items:
+            item_size, item_bytes = self.item_size(item), self.item_bytes(item)
+            if batch and not self._fits(len(batch) + 1, size + item_size, bytes + item_bytes):
+                batches.append(batch)
+                batch, size, bytes = [], empty, 0
+            if not self._fits(len(batch) + 1, size + item_size, bytes + item_bytes):
+                raise PackError("Item does not fit in an operation: %r" % (item,))
+            batch.append(item)
+            size += item_size
+            bytes += item_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def operation_limits(self, batch):
+        """gas_limit and storage_limit to set on the operation of batch."""
+        estimate = self.estimate(batch)
+        return {
+            "gas_limit": min(int(estimate["gas"] * (1 + self.margin)) + 1, self.limits["gas"]),
+            "storage_limit": min(int(estimate["storage"] * (1 + self.margin)) + 1, self.limits["storage"]),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument("queue", help = "JSON list of hashes or mint requests")
+    parser.add_argument("--report", required = True, help = "benchmark report or baseline")
+    parser.add_argument("--target", required = True, help = "e.g. DocumentStore, DocumentNFT_certificate")
+    parser.add_argument("--entrypoint", required = True, choices = sorted(ENTRY_POINTS))
+    parser.add_argument("--margin", type = float, default = 0.1)
+    args = parser.parse_args()
+
+    with open(args.report) as f:
+        report = json.load(f)
+    # mints are fitted with the benchmark's long URIs too
+    long_case = args.entrypoint + "_long" if args.entrypoint == "mint_batch" else None
+    model = CostModel.from_report(report, args.target, args.entrypoint, long_case = long_case)
+    with open(args.queue) as f:
+        queue = json.load(f)
+    items = queue
+    if args.entrypoint == "mint_batch":
+        # metadata values are hex in JSON
+        items = [dict(params, metadata = {k: to_bytes(v) for k, v in params["metadata"].items()}) for params in queue]
+    packer = Packer(model, margin = args.margin)
+    # one line per operation; batches are consecutive slices of the queue
+    start = 0
+    for batch in packer.pack(items):
+        print(json.dumps(dict(packer.operation_limits(batch), items = queue[start:start + len(batch)]), sort_keys = True))
+        start += len(batch)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
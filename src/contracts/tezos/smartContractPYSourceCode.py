@@ -3,88 +3,745 @@ import smartpy as sp
 ContractOwner = sp.address("tz1NXLfpxJ2bF7ehyvwQN69AUZh8FCGPgjmn")
 nullAddress   = sp.address("tz1Ke2h7sDdakHJQh8WX4Z372du1KChsksyU")
 
+# Leaf revocations are packed into nat bitmaps of this many bits per key
+leafWordSize = 256
+
+tBulkParams = sp.TRecord(
+    documents = sp.TList(sp.TBytes),
+    idempotent = sp.TBool
+).layout(("documents", "idempotent"))
+
+tIssuerDocument = sp.TRecord(
+    issuer = sp.TNat,
+    document = sp.TBytes
+).layout(("issuer", "document"))
+
+tIssuerBulkParams = sp.TRecord(
+    issuer = sp.TNat,
+    documents = sp.TList(sp.TBytes),
+    idempotent = sp.TBool
+).layout(("issuer", ("documents", "idempotent")))
+
+tDocumentRecord = sp.TRecord(
+    issued = sp.TOption(sp.TNat),
+    revoked = sp.TOption(sp.TNat)
+).layout(("issued", "revoked"))
+
+tPermitAction = sp.TVariant(
+    issue = sp.TUnit,
+    revoke = sp.TUnit
+).layout(("issue", "revoke"))
+
+tPermitPayload = sp.TRecord(
+    chainId = sp.TChainId,
+    contract = sp.TAddress,
+    nonce = sp.TNat,
+    action = tPermitAction,
+    document = sp.TBytes
+).layout(("chainId", ("contract", ("nonce", ("action", "document")))))
+
+tPermit = sp.TRecord(
+    publicKey = sp.TKey,
+    signature = sp.TSignature,
+    nonce = sp.TNat,
+    action = tPermitAction,
+    document = sp.TBytes
+).layout(("publicKey", ("signature", ("nonce", ("action", "document")))))
+
+tEpochProof = sp.TRecord(
+    document = sp.TBytes,
+    proof = sp.TList(sp.TBytes)
+).layout(("document", "proof"))
+
+tLeafWord = sp.TRecord(
+    root = sp.TBytes,
+    word = sp.TNat
+).layout(("root", "word"))
+
+# Contract events, so indexers can follow changes without polling big_maps
+tDocumentEvent = sp.TRecord(
+    document = sp.TBytes,
+    level = sp.TNat,
+    issuer = sp.TAddress
+).layout(("document", ("level", "issuer")))
+
+tLeavesEvent = sp.TRecord(
+    root = sp.TBytes,
+    indices = sp.TList(sp.TNat),
+    level = sp.TNat,
+    issuer = sp.TAddress
+).layout(("root", ("indices", ("level", "issuer"))))
+
+# issuer is the tenant number, owner the address that made the change
+tIssuerDocumentEvent = sp.TRecord(
+    issuer = sp.TNat,
+    document = sp.TBytes,
+    level = sp.TNat,
+    owner = sp.TAddress
+).layout(("issuer", ("document", ("level", "owner"))))
+
+tOwnershipEvent = sp.TRecord(
+    previousOwner = sp.TAddress,
+    newOwner = sp.TAddress,
+    level = sp.TNat
+).layout(("previousOwner", ("newOwner", "level")))
+
+tDocumentStatus = sp.TRecord(
+    document = sp.TBytes,
+    issued = sp.TOption(sp.TNat),
+    revoked = sp.TOption(sp.TNat)
+).layout(("document", ("issued", "revoked")))
+
+# OpenAttestation status of a target hash in a batch: the proof must lead
+# to root, root must be issued (as a hash or an epoch root) and neither
+# root nor target revoked, as a hash or as leaf index of root
+tVerification = sp.TRecord(
+    proofValid = sp.TBool,
+    rootIssued = sp.TOption(sp.TNat),
+    rootRevoked = sp.TOption(sp.TNat),
+    targetRevoked = sp.TOption(sp.TNat),
+    leafRevoked = sp.TBool,
+    valid = sp.TBool
+).layout(("proofValid", ("rootIssued", ("rootRevoked", ("targetRevoked", ("leafRevoked", "valid"))))))
+
+# Entry of the change log, in level order: a hash issued or revoked, an
+# epoch root committed, or a leaf of a batch root revoked (by its index)
+tChangeAction = sp.TVariant(
+    issue = sp.TUnit,
+    revoke = sp.TUnit,
+    commitEpoch = sp.TUnit,
+    revokeLeaf = sp.TNat
+).layout(("issue", ("revoke", ("commitEpoch", "revokeLeaf"))))
+
+tChange = sp.TRecord(
+    document = sp.TBytes,
+    action = tChangeAction,
+    level = sp.TNat
+).layout(("document", ("action", "level")))
+
+tChangePage = sp.TRecord(
+    changes = sp.TList(tChange),
+    cursor = sp.TNat,
+    changeCount = sp.TNat
+).layout(("changes", ("cursor", "changeCount")))
+
+def changesSince(self, params):
+    # Pages start at the first change at or after level, or at cursor
+    # (the cursor of the previous page) when it is further. Changes are
+    # numbered in level order, so the start is found by binary search.
+    sp.set_type(params, sp.TRecord(level = sp.TNat, cursor = sp.TNat, limit = sp.TNat).layout(("level", ("cursor", "limit"))))
+    low = sp.local("low", sp.nat(0))
+    high = sp.local("high", self.data.changeCount)
+    sp.while low.value < high.value:
+        middle = sp.local("middle", (low.value + high.value) // 2)
+        sp.if self.data.changes[middle.value].level < params.level:
+            low.value = middle.value + 1
+        sp.else:
+            high.value = middle.value
+    sp.if params.cursor > low.value:
+        low.value = params.cursor
+    end = sp.local("end", low.value + params.limit)
+    sp.if end.value > self.data.changeCount:
+        end.value = self.data.changeCount
+    changes = sp.local("changes", sp.list(t = tChange))
+    sp.for index in sp.range(low.value, end.value):
+        changes.value.push(self.data.changes[index])
+    sp.result(sp.set_type_expr(
+        sp.record(changes = changes.value.rev(), cursor = sp.max(low.value, end.value), changeCount = self.data.changeCount),
+        tChangePage
+    ))
+
 class DocumentStore(sp.Contract):
-    def __init__(self, owner, **kargs):
+    def __init__(self, owner, changeLog = False, **kargs):
         metadata = {
             "name": "Document Store",
             "description": "The world's most trusted certificates. NextCert helps you produce next-generation academic and professional certificates, that are cryptographically secure and ...",
             "version": "2.2.0",
             "views": [ self.owner, 
                         self.getIssuedBlock, self.isIssued, self.isIssuedBefore,
-                        self.isRevoked, self.isRevokedBefore
+                        self.isRevoked, self.isRevokedBefore,
+                        self.getDocumentStatus, self.isIssuer,
+                        self.getPermitNonce, self.getPermitPayload,
+                        self.getEpochIssuedBlock, self.isEpochIssuedBefore,
+                        self.isLeafRevoked, self.verifyDocument
                     ],
         }
 
+        # With changeLog, every issuance and revocation (hashes, epoch roots
+        # and leaves) is also appended to an index numbered in level order,
+        # so a mirror can fetch what changed since a level without
+        # rescanning the operation history.
+        self.changeLog = changeLog
+        if changeLog:
+            # attached only here: it reads changes and changeCount
+            self.changesSince = sp.offchain_view(pure = True, doc = "Get a page of the issuances and revocations since a level")(changesSince)
+            metadata["views"].append(self.changesSince)
+            kargs.update(
+                changes = sp.big_map(tkey = sp.TNat, tvalue = tChange),
+                changeCount = sp.nat(0)
+            )
+
         self.init_metadata("metadata", metadata)
         
         self.init(
             owner = owner, 
+            issuers = sp.set(t = sp.TAddress),
+            permitNonces = sp.big_map(tkey = sp.TAddress, tvalue = sp.TNat),
+            epochIssued = sp.big_map(tkey = sp.TBytes, tvalue = sp.TNat),
+            revokedLeaves = sp.big_map(tkey = tLeafWord, tvalue = sp.TNat),
+            **self.documentStorage(),
+            **kargs
+        )
+
+    # Storage layout: every read and write of document levels goes through
+    # these helpers so that other layouts only have to override them.
+    def documentStorage(self):
+        return dict(
             documentIssued = sp.big_map(tkey = sp.TBytes, tvalue = sp.TNat),
             documentRevoked = sp.big_map(tkey = sp.TBytes, tvalue = sp.TNat),
-            **kargs
+        )
+    def hasIssued(self, document):
+        return self.data.documentIssued.contains(document)
+    def hasRevoked(self, document):
+        return self.data.documentRevoked.contains(document)
+    def issuedLevel(self, document):
+        return self.data.documentIssued.get_opt(document)
+    def revokedLevel(self, document):
+        return self.data.documentRevoked.get_opt(document)
+    def setIssued(self, document):
+        self.data.documentIssued[document] = sp.level
+    def setRevoked(self, document):
+        self.data.documentRevoked[document] = sp.level
+    def documentStatus(self, document):
+        return sp.record(
+            document = document,
+            issued = self.issuedLevel(document),
+            revoked = self.revokedLevel(document)
         )
 
     def onlyOwner(self):
         sp.verify_equal(sp.sender, self.data.owner, 'Invalid Owner')
-    def onlyIssued(self, document):
-        sp.verify(self.data.documentIssued.contains(document), 'Error: Only issued document hashes can be revoked')
+    def documentChanged(self, action, document, issuer):
+        # action is "issue" or "revoke"; every hash write goes through here,
+        # epoch roots and leaves go to logChange directly
+        sp.emit(sp.set_type_expr(sp.record(document = document, level = sp.level, issuer = issuer), tDocumentEvent), tag = {"issue": "issued", "revoke": "revoked"}[action], with_type = True)
+        self.logChange(document, sp.variant(action, sp.unit))
+    def logChange(self, document, action):
+        if self.changeLog:
+            self.data.changes[self.data.changeCount] = sp.set_type_expr(sp.record(document = document, action = action, level = sp.level), tChange)
+            self.data.changeCount += 1
+    def emitOwnership(self, newOwner):
+        sp.emit(sp.set_type_expr(sp.record(previousOwner = self.data.owner, newOwner = newOwner, level = sp.level), tOwnershipEvent), tag = "ownershipTransferred", with_type = True)
+    def isAuthorized(self, address):
+        return (address == self.data.owner) | self.data.issuers.contains(address)
+    def onlyIssuer(self):
+        sp.verify(self.isAuthorized(sp.sender), 'Invalid Issuer')
+    def leafRevoked(self, root, index):
+        word = self.data.revokedLeaves.get(sp.record(root = root, word = index // leafWordSize), default_value = 0)
+        return (word >> (index % leafWordSize)) % 2 == 1
+    def merkleRoot(self, leaf, proof):
+        # Same hashing as OpenAttestation: keccak256 of the sorted pair
+        node = sp.local("node", leaf)
+        sp.for sibling in proof:
+            sp.if node.value < sibling:
+                node.value = sp.keccak(node.value + sibling)
+            sp.else:
+                node.value = sp.keccak(sibling + node.value)
+        return node.value
+
     def onlyNotIssued(self, document):
-        sp.verify_equal(self.data.documentIssued.contains(document), False, 'Error: Only hashes that have not been issued can be issued')
+        sp.verify_equal(self.hasIssued(document), False, 'Error: Only hashes that have not been issued can be issued')
     def onlyNotRevoked(self, claim):
-        sp.verify_equal(self.data.documentRevoked.contains(claim), False, 'Error: Hash has been revoked previously')
+        sp.verify_equal(self.hasRevoked(claim), False, 'Error: Hash has been revoked previously')
     
     @sp.entry_point
     def transferOwnership(self, newOwner):
         self.onlyOwner()
+        self.emitOwnership(newOwner)
         self.data.owner = newOwner
+        # the issuers were the previous owner's keys: the new owner adds its own
+        self.data.issuers = sp.set(t = sp.TAddress)
 
     @sp.entry_point
     def renounceOwnership(self):
         self.onlyOwner()
+        self.emitOwnership(nullAddress)
         self.data.owner = nullAddress
+        self.data.issuers = sp.set(t = sp.TAddress)
 
+    # Issuers may issue and revoke next to the owner, so several keys can
+    # get operations on this contract into the same block.
     @sp.entry_point
-    def issue(self, document):
+    def addIssuer(self, issuer):
+        sp.set_type(issuer, sp.TAddress)
         self.onlyOwner()
+        self.data.issuers.add(issuer)
+
+    @sp.entry_point
+    def removeIssuer(self, issuer):
+        sp.set_type(issuer, sp.TAddress)
+        self.onlyOwner()
+        self.data.issuers.remove(issuer)
+
+    def issueDocument(self, document, idempotent, issuer):
+        sp.if self.hasIssued(document):
+            sp.verify(idempotent, 'Error: Only hashes that have not been issued can be issued')
+        sp.else:
+            self.setIssued(document)
+            self.documentChanged("issue", document, issuer)
+
+    def revokeDocument(self, document, idempotent, issuer):
+        sp.if self.hasRevoked(document):
+            sp.verify(idempotent, 'Error: Hash has been revoked previously')
+        sp.else:
+            self.setRevoked(document)
+            self.documentChanged("revoke", document, issuer)
+
+    @sp.entry_point
+    def issue(self, document):
+        self.onlyIssuer()
         self.onlyNotIssued(document)
-        self.data.documentIssued[document] = sp.level
+        self.setIssued(document)
+        self.documentChanged("issue", document, sp.sender)
 
     @sp.entry_point
     def revoke(self, document):
-        self.onlyOwner()
+        self.onlyIssuer()
         self.onlyNotRevoked(document)
-        self.data.documentRevoked[document] = sp.level
+        self.setRevoked(document)
+        self.documentChanged("revoke", document, sp.sender)
+
+    @sp.entry_point
+    def bulkIssue(self, params):
+        # idempotent: skip hashes that are already issued instead of failing,
+        # so a batch can be resubmitted after a confirmation timeout
+        sp.set_type(params, tBulkParams)
+        self.onlyIssuer()
+        sp.for document in params.documents:
+            self.issueDocument(document, params.idempotent, sp.sender)
+
+    @sp.entry_point
+    def bulkRevoke(self, params):
+        sp.set_type(params, tBulkParams)
+        self.onlyIssuer()
+        sp.for document in params.documents:
+            self.revokeDocument(document, params.idempotent, sp.sender)
+
+    # An epoch root is the merkle root over many batch roots. Committing it
+    # anchors all of them with a single big_map entry; a batch is then proven
+    # issued by its inclusion proof against the epoch root.
+    @sp.entry_point
+    def commitEpoch(self, root):
+        sp.set_type(root, sp.TBytes)
+        self.onlyIssuer()
+        sp.verify(~self.data.epochIssued.contains(root), 'Error: Epoch root has been committed previously')
+        self.data.epochIssued[root] = sp.level
+        self.logChange(root, sp.variant("commitEpoch", sp.unit))
+        sp.emit(sp.set_type_expr(sp.record(document = root, level = sp.level, issuer = sp.sender), tDocumentEvent), tag = "epochCommitted", with_type = True)
+
+    # Revokes leaves of a batch by their position in the merkle tree. Each
+    # big_map entry holds leafWordSize revocation bits of one batch root, so
+    # a mass revocation costs about a bit per leaf instead of a key per hash.
+    @sp.entry_point
+    def revokeLeaves(self, params):
+        sp.set_type(params, sp.TRecord(root = sp.TBytes, indices = sp.TList(sp.TNat)).layout(("root", "indices")))
+        self.onlyIssuer()
+        sp.for index in params.indices:
+            key = sp.local("key", sp.record(root = params.root, word = index // leafWordSize))
+            shift = sp.local("shift", index % leafWordSize)
+            word = sp.local("word", self.data.revokedLeaves.get(key.value, default_value = 0))
+            sp.if (word.value >> shift.value) % 2 == 0:
+                self.data.revokedLeaves[key.value] = word.value + (sp.nat(1) << shift.value)
+                self.logChange(params.root, sp.variant("revokeLeaf", index))
+        sp.emit(sp.set_type_expr(sp.record(root = params.root, indices = params.indices, level = sp.level, issuer = sp.sender), tLeavesEvent), tag = "leavesRevoked", with_type = True)
+
+    def permitPayload(self, nonce, action, document):
+        return sp.pack(sp.set_type_expr(
+            sp.record(
+                chainId = sp.chain_id,
+                contract = sp.self_address,
+                nonce = nonce,
+                action = action,
+                document = document
+            ),
+            tPermitPayload
+        ))
+
+    # Permits are issue/revoke actions signed off-chain by the owner or an
+    # issuer, so a relayer can submit any number of them in one operation.
+    # Each signer has its own nonce, which makes every permit single-use.
+    @sp.entry_point
+    def permit(self, permits):
+        sp.set_type(permits, sp.TList(tPermit))
+        sp.for permit in permits:
+            signer = sp.local("signer", sp.to_address(sp.implicit_account(sp.hash_key(permit.publicKey))))
+            sp.verify(self.isAuthorized(signer.value), 'Invalid Issuer')
+            sp.verify_equal(permit.nonce, self.data.permitNonces.get(signer.value, default_value = 0), 'Error: Invalid permit nonce')
+            sp.verify(
+                sp.check_signature(permit.publicKey, permit.signature, self.permitPayload(permit.nonce, permit.action, permit.document)),
+                'Error: Invalid permit signature'
+            )
+            self.data.permitNonces[signer.value] = permit.nonce + 1
+            with permit.action.match_cases() as arg:
+                with arg.match("issue"):
+                    self.issueDocument(permit.document, sp.bool(False), signer.value)
+                with arg.match("revoke"):
+                    self.revokeDocument(permit.document, sp.bool(False), signer.value)
 
     @sp.offchain_view(pure = True, doc = "Get owner address")
     def owner(self):
         sp.result(self.data.owner)
 
+    @sp.offchain_view(pure = True, doc = "Check issuer authorization")
+    def isIssuer(self, address):
+        sp.set_type(address, sp.TAddress)
+        sp.result(self.isAuthorized(address))
+
+    @sp.offchain_view(pure = True, doc = "Get issued level of the epoch including a document")
+    def getEpochIssuedBlock(self, params):
+        sp.set_type(params, tEpochProof)
+        sp.result(self.data.epochIssued.get_opt(self.merkleRoot(params.document, params.proof)))
+
+    @sp.offchain_view(pure = True, doc = "Check issued before through an epoch")
+    def isEpochIssuedBefore(self, params):
+        sp.set_type(params, sp.TRecord(document = sp.TBytes, proof = sp.TList(sp.TBytes), blockNumber = sp.TNat).layout(("document", ("proof", "blockNumber"))))
+        level = sp.local("level", self.data.epochIssued.get_opt(self.merkleRoot(params.document, params.proof)))
+        sp.if level.value.is_some():
+            sp.result(level.value.open_some() < params.blockNumber)
+        sp.else:
+            sp.result(False)
+
+    @sp.offchain_view(pure = True, doc = "Check leaf revoked in a batch")
+    def isLeafRevoked(self, params):
+        sp.set_type(params, sp.TRecord(root = sp.TBytes, index = sp.TNat).layout(("root", "index")))
+        sp.result(self.leafRevoked(params.root, params.index))
+
+    @sp.offchain_view(pure = True, doc = "Get next permit nonce of a signer")
+    def getPermitNonce(self, address):
+        sp.set_type(address, sp.TAddress)
+        sp.result(self.data.permitNonces.get(address, default_value = 0))
+
+    @sp.offchain_view(pure = False, doc = "Get bytes to sign for a permit")
+    def getPermitPayload(self, params):
+        sp.set_type(params, sp.TRecord(nonce = sp.TNat, action = tPermitAction, document = sp.TBytes).layout(("nonce", ("action", "document"))))
+        sp.result(self.permitPayload(params.nonce, params.action, params.document))
+
     @sp.offchain_view(pure = True, doc = "Get issued level")
     def getIssuedBlock(self, document):
-        self.onlyIssued(document)
-        sp.result(self.data.documentIssued[document])
+        sp.result(self.issuedLevel(document).open_some(message = 'Error: Only issued document hashes can be revoked'))
 
     @sp.offchain_view(pure = True, doc = "Check issued existence")
     def isIssued(self, document):
-        sp.result(self.data.documentIssued.contains(document))
+        sp.result(self.hasIssued(document))
 
     @sp.offchain_view(pure = True, doc = "Check issued before")
     def isIssuedBefore(self, params):
-        a = self.data.documentIssued.contains(params.document)
-        b = self.data.documentIssued[params.document] < params.blockNumber
-        r = a & b
-        sp.result(r)
+        level = sp.local("level", self.issuedLevel(params.document))
+        sp.if level.value.is_some():
+            sp.result(level.value.open_some() < params.blockNumber)
+        sp.else:
+            sp.result(False)
 
     @sp.offchain_view(pure = True, doc = "Check revoked existence")
     def isRevoked(self, document):
-        sp.result(self.data.documentRevoked.contains(document))
+        sp.result(self.hasRevoked(document))
+
+    @sp.offchain_view(pure = True, doc = "Check revoked before")
+    def isRevokedBefore(self, params):
+        level = sp.local("level", self.revokedLevel(params.document))
+        sp.if level.value.is_some():
+            sp.result(level.value.open_some() < params.blockNumber)
+        sp.else:
+            sp.result(False)
+
+    @sp.offchain_view(pure = True, doc = "Get issued and revoked levels of documents")
+    def getDocumentStatus(self, documents):
+        sp.set_type(documents, sp.TList(sp.TBytes))
+        def status(document):
+            sp.result(sp.set_type_expr(self.documentStatus(document), tDocumentStatus))
+        sp.result(documents.map(status))
+
+    @sp.offchain_view(pure = True, doc = "Verify a target hash against its batch root")
+    def verifyDocument(self, params):
+        # Everything an OpenAttestation verifier checks, in one call: the
+        # root is recomputed here instead of by the client. A root committed
+        # with commitEpoch counts as issued at the epoch level. index is the
+        # position of target among the leaves of root, as revoked by
+        # revokeLeaves: it is required, so that valid never overlooks a leaf
+        # revocation.
+        sp.set_type(params, sp.TRecord(
+            target = sp.TBytes,
+            proof = sp.TList(sp.TBytes),
+            root = sp.TBytes,
+            index = sp.TNat
+        ).layout(("target", ("proof", ("root", "index")))))
+        proofValid = sp.local("proofValid", self.merkleRoot(params.target, params.proof) == params.root)
+        rootIssued = sp.local("rootIssued", self.issuedLevel(params.root))
+        sp.if rootIssued.value.is_none():
+            rootIssued.value = self.data.epochIssued.get_opt(params.root)
+        rootRevoked = sp.local("rootRevoked", self.revokedLevel(params.root))
+        targetRevoked = sp.local("targetRevoked", self.revokedLevel(params.target))
+        leafRevoked = sp.local("leafRevoked", self.leafRevoked(params.root, params.index))
+        sp.result(sp.set_type_expr(sp.record(
+            proofValid = proofValid.value,
+            rootIssued = rootIssued.value,
+            rootRevoked = rootRevoked.value,
+            targetRevoked = targetRevoked.value,
+            leafRevoked = leafRevoked.value,
+            valid = proofValid.value & rootIssued.value.is_some() & rootRevoked.value.is_none()
+                & targetRevoked.value.is_none() & ~leafRevoked.value
+        ), tVerification))
+
+    # On-chain views: other contracts read the same answers synchronously
+    # with VIEW, instead of a callback round-trip over several operations.
+    @sp.onchain_view(name = "isIssued")
+    def isIssuedOnChain(self, document):
+        sp.set_type(document, sp.TBytes)
+        sp.result(self.hasIssued(document))
+
+    @sp.onchain_view(name = "isRevoked")
+    def isRevokedOnChain(self, document):
+        sp.set_type(document, sp.TBytes)
+        sp.result(self.hasRevoked(document))
+
+    @sp.onchain_view(name = "getIssuedBlock")
+    def getIssuedBlockOnChain(self, document):
+        sp.set_type(document, sp.TBytes)
+        sp.result(self.issuedLevel(document).open_some(message = 'Error: Only issued document hashes can be revoked'))
+
+    @sp.onchain_view(name = "getDocumentStatus")
+    def getDocumentStatusOnChain(self, document):
+        sp.set_type(document, sp.TBytes)
+        sp.result(sp.set_type_expr(self.documentStatus(document), tDocumentStatus))
+
+    @sp.onchain_view(name = "isValid")
+    def isValidOnChain(self, document):
+        sp.set_type(document, sp.TBytes)
+        sp.result(self.hasIssued(document) & ~self.hasRevoked(document))
+
+class DocumentStoreUnified(DocumentStore):
+    """DocumentStore keeping a single big_map entry per document.
+
+    The value holds both levels, so a revocation rewrites the value instead
+    of paying for a second key, and a full status check is one lookup. The
+    issued level is optional too: revoking a hash that was never issued
+    (e.g. a target hash inside a batch) is allowed, as in DocumentStore.
+
+    Storage paid per 32-byte hash, estimated from the key and value sizes
+at 65 bytes per fresh big_map key; not measured yet, see benchmark.py:
+
+        lifecycle        DocumentStore   DocumentStoreUnified
+        issue            107             113
+        issue + revoke   214             118
+        revoke only      107             113
+    """
+    def documentStorage(self):
+        return dict(
+            documents = sp.big_map(tkey = sp.TBytes, tvalue = tDocumentRecord),
+        )
+    def documentRecord(self, document):
+        return self.data.documents.get(document, default_value = sp.record(issued = sp.none, revoked = sp.none))
+    def hasIssued(self, document):
+        return self.issuedLevel(document).is_some()
+    def hasRevoked(self, document):
+        return self.revokedLevel(document).is_some()
+    def issuedLevel(self, document):
+        return self.documentRecord(document).issued
+    def revokedLevel(self, document):
+        return self.documentRecord(document).revoked
+    def setIssued(self, document):
+        self.data.documents[document] = sp.record(issued = sp.some(sp.level), revoked = self.revokedLevel(document))
+    def setRevoked(self, document):
+        self.data.documents[document] = sp.record(issued = self.issuedLevel(document), revoked = sp.some(sp.level))
+    def documentStatus(self, document):
+        record = sp.local("record", self.documentRecord(document))
+        return sp.record(
+            document = document,
+            issued = record.value.issued,
+            revoked = record.value.revoked
+        )
+
+class MultiTenantDocumentStore(sp.Contract):
+    """DocumentStore shared by many issuers.
+
+    Issuers are numbered when the administrator registers them, and every
+    document is keyed by (issuer, document). Onboarding an issuer writes a
+    single big_map entry instead of originating a new contract. Each issuer
+    has its own owner, with the same ownership and issuance rules as
+    DocumentStore.
+    """
+    def __init__(self, administrator, **kargs):
+        metadata = {
+            "name": "Multi-tenant Document Store",
+            "description": "The world's most trusted certificates. NextCert helps you produce next-generation academic and professional certificates, that are cryptographically secure and ...",
+            "version": "2.2.0",
+            "views": [ self.administrator, self.owner,
+                        self.getIssuedBlock, self.isIssued, self.isIssuedBefore,
+                        self.isRevoked, self.isRevokedBefore,
+                        self.getDocumentStatus
+                    ],
+        }
+
+        self.init_metadata("metadata", metadata)
+
+        self.init(
+            administrator = administrator,
+            issuers = sp.big_map(tkey = sp.TNat, tvalue = sp.TAddress),
+            issuerCount = sp.nat(0),
+            documentIssued = sp.big_map(tkey = tIssuerDocument, tvalue = sp.TNat),
+            documentRevoked = sp.big_map(tkey = tIssuerDocument, tvalue = sp.TNat),
+            **kargs
+        )
+
+    def onlyAdministrator(self):
+        sp.verify_equal(sp.sender, self.data.administrator, 'Invalid Administrator')
+    def onlyOwner(self, issuer):
+        sp.verify_equal(sp.sender, self.data.issuers.get(issuer, message = 'Error: Unknown issuer'), 'Invalid Owner')
+
+    def emitDocument(self, tag, key):
+        sp.emit(sp.set_type_expr(sp.record(issuer = key.issuer, document = key.document, level = sp.level, owner = sp.sender), tIssuerDocumentEvent), tag = tag, with_type = True)
+
+    def issueDocument(self, key, idempotent):
+        sp.if self.data.documentIssued.contains(key):
+            sp.verify(idempotent, 'Error: Only hashes that have not been issued can be issued')
+        sp.else:
+            self.data.documentIssued[key] = sp.level
+            self.emitDocument("issued", key)
+
+    def revokeDocument(self, key, idempotent):
+        sp.if self.data.documentRevoked.contains(key):
+            sp.verify(idempotent, 'Error: Hash has been revoked previously')
+        sp.else:
+            self.data.documentRevoked[key] = sp.level
+            self.emitDocument("revoked", key)
+
+    @sp.entry_point
+    def setAdministrator(self, newAdministrator):
+        self.onlyAdministrator()
+        self.data.administrator = newAdministrator
+
+    @sp.entry_point
+    def registerIssuer(self, owner):
+        sp.set_type(owner, sp.TAddress)
+        self.onlyAdministrator()
+        self.data.issuers[self.data.issuerCount] = owner
+        self.data.issuerCount += 1
+
+    @sp.entry_point
+    def transferOwnership(self, params):
+        sp.set_type(params, sp.TRecord(issuer = sp.TNat, newOwner = sp.TAddress).layout(("issuer", "newOwner")))
+        self.onlyOwner(params.issuer)
+        self.data.issuers[params.issuer] = params.newOwner
+
+    @sp.entry_point
+    def renounceOwnership(self, issuer):
+        sp.set_type(issuer, sp.TNat)
+        self.onlyOwner(issuer)
+        self.data.issuers[issuer] = nullAddress
+
+    @sp.entry_point
+    def issue(self, params):
+        sp.set_type(params, tIssuerDocument)
+        self.onlyOwner(params.issuer)
+        self.issueDocument(params, sp.bool(False))
+
+    @sp.entry_point
+    def revoke(self, params):
+        sp.set_type(params, tIssuerDocument)
+        self.onlyOwner(params.issuer)
+        self.revokeDocument(params, sp.bool(False))
+
+    @sp.entry_point
+    def bulkIssue(self, params):
+        sp.set_type(params, tIssuerBulkParams)
+        self.onlyOwner(params.issuer)
+        sp.for document in params.documents:
+            self.issueDocument(sp.record(issuer = params.issuer, document = document), params.idempotent)
+
+    @sp.entry_point
+    def bulkRevoke(self, params):
+        sp.set_type(params, tIssuerBulkParams)
+        self.onlyOwner(params.issuer)
+        sp.for document in params.documents:
+            self.revokeDocument(sp.record(issuer = params.issuer, document = document), params.idempotent)
+
+    @sp.offchain_view(pure = True, doc = "Get administrator address")
+    def administrator(self):
+        sp.result(self.data.administrator)
+
+    @sp.offchain_view(pure = True, doc = "Get owner address of an issuer")
+    def owner(self, issuer):
+        sp.set_type(issuer, sp.TNat)
+        sp.result(self.data.issuers.get(issuer, message = 'Error: Unknown issuer'))
+
+    @sp.offchain_view(pure = True, doc = "Get issued level")
+    def getIssuedBlock(self, params):
+        sp.set_type(params, tIssuerDocument)
+        sp.result(self.data.documentIssued.get(params, message = 'Error: Only issued document hashes can be revoked'))
+
+    @sp.offchain_view(pure = True, doc = "Check issued existence")
+    def isIssued(self, params):
+        sp.set_type(params, tIssuerDocument)
+        sp.result(self.data.documentIssued.contains(params))
+
+    @sp.offchain_view(pure = True, doc = "Check issued before")
+    def isIssuedBefore(self, params):
+        key = sp.record(issuer = params.issuer, document = params.document)
+        level = sp.local("level", self.data.documentIssued.get_opt(key))
+        sp.if level.value.is_some():
+            sp.result(level.value.open_some() < params.blockNumber)
+        sp.else:
+            sp.result(False)
+
+    @sp.offchain_view(pure = True, doc = "Check revoked existence")
+    def isRevoked(self, params):
+        sp.set_type(params, tIssuerDocument)
+        sp.result(self.data.documentRevoked.contains(params))
 
     @sp.offchain_view(pure = True, doc = "Check revoked before")
     def isRevokedBefore(self, params):
-        a = self.data.documentRevoked.contains(params.document)
-        b = self.data.documentRevoked[params.document] < params.blockNumber
-        r = a & b
-        sp.result(r)
+        key = sp.record(issuer = params.issuer, document = params.document)
+        level = sp.local("level", self.data.documentRevoked.get_opt(key))
+        sp.if level.value.is_some():
+            sp.result(level.value.open_some() < params.blockNumber)
+        sp.else:
+            sp.result(False)
+
+    @sp.offchain_view(pure = True, doc = "Get issued and revoked levels of documents")
+    def getDocumentStatus(self, params):
+        sp.set_type(params, sp.TRecord(issuer = sp.TNat, documents = sp.TList(sp.TBytes)).layout(("issuer", "documents")))
+        def status(document):
+            key = sp.record(issuer = params.issuer, document = document)
+            sp.result(sp.set_type_expr(
+                sp.record(
+                    document = document,
+                    issued = self.data.documentIssued.get_opt(key),
+                    revoked = self.data.documentRevoked.get_opt(key)
+                ),
+                tDocumentStatus
+            ))
+        sp.result(params.documents.map(status))
+
+class DocumentGate(sp.Contract):
+    """Example consumer of the DocumentStore on-chain views.
+
+    check only passes for documents that are issued and not revoked in the
+    given store, in the same operation, as a gated minter or an escrow
+    would do before releasing anything.
+    """
+    def __init__(self, store, **kargs):
+        self.init(
+            store = sp.set_type_expr(store, sp.TAddress),
+            checks = sp.nat(0),
+            **kargs
+        )
+
+    @sp.entry_point
+    def check(self, document):
+        sp.set_type(document, sp.TBytes)
+        valid = sp.view("isValid", self.data.store, document, t = sp.TBool).open_some(message = 'Error: Invalid store')
+        sp.verify(valid, 'Error: Document is not valid')
+        self.data.checks += 1
 
 @sp.add_target(name = "orig", kind = "origination")
 def origin():
@@ -121,6 +778,126 @@ def test():
     scenario.verify(c1.owner() == nullAddress)
 
 
+@sp.add_test(name = "test issuers")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+    issuer1 = sp.test_account("Issuer1")
+    issuer2 = sp.test_account("Issuer2")
+    newOwner = sp.test_account("NewOwner")
+
+    # init contract & scenario
+    scenario = sp.test_scenario()
+    c7 = DocumentStore(
+        owner.address, 
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c7
+
+    # init documents
+    document1 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    document2 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+
+    # only the owner manages issuers
+    c7.addIssuer(issuer1.address).run(sender=issuer1.address, valid=False)
+    c7.addIssuer(issuer1.address).run(sender=owner.address)
+    c7.addIssuer(issuer2.address).run(sender=owner.address)
+    scenario.verify(c7.isIssuer(owner.address))
+    scenario.verify(c7.isIssuer(issuer1.address))
+
+    # issuers issue and revoke in the same block
+    c7.issue(document1).run(sender=issuer1.address, level=1234)
+    c7.bulkIssue(documents = [document2], idempotent = False).run(sender=issuer2.address, level=1234)
+    c7.revoke(document1).run(sender=issuer2.address, level=1235)
+    scenario.verify(c7.getIssuedBlock(document2) == 1234)
+    scenario.verify(c7.isRevoked(document1))
+
+    # issuers cannot manage issuers or ownership
+    c7.addIssuer(issuer2.address).run(sender=issuer1.address, valid=False)
+    c7.transferOwnership(issuer1.address).run(sender=issuer1.address, valid=False)
+
+    # removed issuers lose access
+    c7.removeIssuer(issuer2.address).run(sender=owner.address)
+    scenario.verify(~c7.isIssuer(issuer2.address))
+    c7.revoke(document2).run(sender=issuer2.address, valid=False)
+
+    # a new owner starts without the previous owner's issuers
+    c7.transferOwnership(newOwner.address).run(sender=owner.address)
+    scenario.verify(~c7.isIssuer(issuer1.address))
+    c7.revoke(document2).run(sender=issuer1.address, valid=False)
+    c7.addIssuer(issuer1.address).run(sender=newOwner.address)
+    scenario.verify(c7.isIssuer(issuer1.address))
+
+    # renouncing ownership also drops the issuers
+    c7.renounceOwnership().run(sender=newOwner.address)
+    c7.revoke(document2).run(sender=issuer1.address, valid=False)
+
+
+@sp.add_test(name = "test permit")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+    issuer = sp.test_account("Issuer")
+    relayer = sp.test_account("Relayer")
+    chainId = sp.chain_id_cst("0x9caecab9")
+
+    # init contract & scenario
+    scenario = sp.test_scenario()
+    c8 = DocumentStore(
+        owner.address, 
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c8
+    c8.addIssuer(issuer.address).run(sender=owner.address)
+
+    # init documents
+    document1 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    document2 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+
+    def makePermit(account, nonce, action, document):
+        payload = sp.pack(sp.set_type_expr(
+            sp.record(chainId = chainId, contract = c8.address, nonce = nonce, action = action, document = document),
+            tPermitPayload
+        ))
+        return sp.record(
+            publicKey = account.public_key,
+            signature = sp.make_signature(account.secret_key, payload, message_format = "Raw"),
+            nonce = nonce,
+            action = action,
+            document = document
+        )
+
+    issueAction = sp.variant("issue", sp.unit)
+    revokeAction = sp.variant("revoke", sp.unit)
+    ownerIssue = makePermit(owner, 0, issueAction, document1)
+    issuerIssue = makePermit(issuer, 0, issueAction, document2)
+    ownerRevoke = makePermit(owner, 1, revokeAction, document1)
+
+    # a relayer submits permits from several signers in one operation
+    c8.permit([ownerIssue, issuerIssue, ownerRevoke]).run(sender=relayer.address, level=1234, chain_id=chainId)
+    scenario.verify(c8.getIssuedBlock(document1) == 1234)
+    scenario.verify(c8.getIssuedBlock(document2) == 1234)
+    scenario.verify(c8.isRevoked(document1))
+    scenario.verify(c8.getPermitNonce(owner.address) == 2)
+    scenario.verify(c8.getPermitNonce(issuer.address) == 1)
+
+    # permits cannot be replayed
+    c8.permit([issuerIssue]).run(sender=relayer.address, chain_id=chainId, valid=False)
+
+    # the signature must match the permit
+    forged = sp.record(
+        publicKey = issuer.public_key,
+        signature = issuerIssue.signature,
+        nonce = 1,
+        action = revokeAction,
+        document = document2
+    )
+    c8.permit([forged]).run(sender=relayer.address, chain_id=chainId, valid=False)
+
+    # signers must be authorized
+    c8.permit([makePermit(relayer, 0, issueAction, document1)]).run(sender=relayer.address, chain_id=chainId, valid=False)
+
+
 @sp.add_test(name = "test function")
 def test():
     # init accounts
@@ -161,6 +938,537 @@ def test():
     scenario.verify(c2.isRevokedBefore(param1))
 
 
+@sp.add_test(name = "test bulk")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+    user = sp.test_account("User")
+
+    # init contract & scenario
+    scenario = sp.test_scenario()
+    c3 = DocumentStore(
+        owner.address, 
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c3
+
+    # init documents
+    document1 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    document2 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+    document3 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee02")
+
+    # only owner can bulkIssue
+    c3.bulkIssue(documents = [document1, document2], idempotent = False).run(sender=user.address, valid=False)
+
+    # bulkIssue
+    c3.bulkIssue(documents = [document1, document2], idempotent = False).run(sender=owner.address, level=1234)
+    scenario.verify(c3.isIssued(document1))
+    scenario.verify(c3.isIssued(document2))
+
+    # strict mode fails the whole batch on an issued hash
+    c3.bulkIssue(documents = [document3, document1], idempotent = False).run(sender=owner.address, valid=False)
+    scenario.verify(~c3.isIssued(document3))
+
+    # idempotent mode skips issued hashes and keeps their level
+    c3.bulkIssue(documents = [document3, document1], idempotent = True).run(sender=owner.address, level=1240)
+    scenario.verify(c3.getIssuedBlock(document1) == 1234)
+    scenario.verify(c3.getIssuedBlock(document3) == 1240)
+
+    # bulkRevoke
+    c3.bulkRevoke(documents = [document1, document2], idempotent = False).run(sender=owner.address, level=1250)
+    scenario.verify(c3.isRevoked(document1))
+    scenario.verify(c3.isRevoked(document2))
+    c3.bulkRevoke(documents = [document2], idempotent = False).run(sender=owner.address, valid=False)
+    c3.bulkRevoke(documents = [document2, document3], idempotent = True).run(sender=owner.address, level=1260)
+    scenario.verify(c3.isRevoked(document3))
+
+
+@sp.add_test(name = "test epoch")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+    user = sp.test_account("User")
+
+    # init contract & scenario
+    scenario = sp.test_scenario()
+    c9 = DocumentStore(
+        owner.address, 
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c9
+
+    # epoch of three batch roots: root = H(H(batch1, batch2), batch3),
+    # with H the keccak256 of the sorted pair
+    batch1 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    batch2 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+    batch3 = sp.bytes("0x917fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee02")
+    node12 = sp.keccak(batch1 + batch2)
+    epochRoot = sp.keccak(node12 + batch3)
+
+    c9.commitEpoch(epochRoot).run(sender=user.address, valid=False)
+    c9.commitEpoch(epochRoot).run(sender=owner.address, level=1234)
+    c9.commitEpoch(epochRoot).run(sender=owner.address, valid=False)
+
+    # every batch resolves to the epoch level through its proof
+    scenario.verify(c9.getEpochIssuedBlock(sp.record(document = batch1, proof = [batch2, batch3])) == sp.some(1234))
+    scenario.verify(c9.getEpochIssuedBlock(sp.record(document = batch2, proof = [batch1, batch3])) == sp.some(1234))
+    scenario.verify(c9.getEpochIssuedBlock(sp.record(document = batch3, proof = [node12])) == sp.some(1234))
+    scenario.verify(c9.isEpochIssuedBefore(sp.record(document = batch3, proof = [node12], blockNumber = 1235)))
+    scenario.verify(~c9.isEpochIssuedBefore(sp.record(document = batch3, proof = [node12], blockNumber = 1234)))
+
+    # a wrong proof does not resolve
+    scenario.verify(c9.getEpochIssuedBlock(sp.record(document = batch1, proof = [batch3])) == sp.none)
+    scenario.verify(~c9.isIssued(batch1))
+
+@sp.add_test(name = "test leaf revocation")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+    user = sp.test_account("User")
+
+    # init contract & scenario
+    scenario = sp.test_scenario()
+    c10 = DocumentStore(
+        owner.address, 
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c10
+
+    root = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    otherRoot = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+
+    c10.revokeLeaves(root = root, indices = [0, 3]).run(sender=user.address, valid=False)
+
+    # revoke leaves across two words, repeating one
+    c10.revokeLeaves(root = root, indices = [0, 3, 255, 256, 3, 1000]).run(sender=owner.address)
+    scenario.verify(c10.isLeafRevoked(sp.record(root = root, index = 0)))
+    scenario.verify(c10.isLeafRevoked(sp.record(root = root, index = 3)))
+    scenario.verify(c10.isLeafRevoked(sp.record(root = root, index = 255)))
+    scenario.verify(c10.isLeafRevoked(sp.record(root = root, index = 256)))
+    scenario.verify(c10.isLeafRevoked(sp.record(root = root, index = 1000)))
+    scenario.verify(~c10.isLeafRevoked(sp.record(root = root, index = 1)))
+    scenario.verify(~c10.isLeafRevoked(sp.record(root = root, index = 257)))
+    scenario.verify(~c10.isLeafRevoked(sp.record(root = otherRoot, index = 0)))
+
+    # a repeated revocation keeps the bitmap unchanged
+    c10.revokeLeaves(root = root, indices = [3]).run(sender=owner.address)
+    scenario.verify(c10.isLeafRevoked(sp.record(root = root, index = 3)))
+    scenario.verify(~c10.isLeafRevoked(sp.record(root = root, index = 2)))
+
+@sp.add_test(name = "test document status")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+
+    # init contract & scenario
+    scenario = sp.test_scenario()
+    c4 = DocumentStore(
+        owner.address, 
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c4
+
+    # init documents
+    issued = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    revoked = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+    unknown = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee02")
+
+    c4.issue(issued).run(sender=owner.address, level=1234)
+    c4.issue(revoked).run(sender=owner.address, level=1235)
+    c4.revoke(revoked).run(sender=owner.address, level=1236)
+
+    # one call answers for every hash, in order
+    scenario.verify_equal(
+        c4.getDocumentStatus([issued, revoked, unknown]),
+        [
+            sp.record(document = issued, issued = sp.some(1234), revoked = sp.none),
+            sp.record(document = revoked, issued = sp.some(1235), revoked = sp.some(1236)),
+            sp.record(document = unknown, issued = sp.none, revoked = sp.none),
+        ]
+    )
+
+
+@sp.add_test(name = "test unified layout")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+
+    # init contract & scenario
+    scenario = sp.test_scenario()
+    c5 = DocumentStoreUnified(
+        owner.address, 
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c5
+
+    # init documents
+    document = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    target = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+    param1 = sp.record(document=document, blockNumber=1235)
+
+    # issue
+    c5.issue(document).run(sender=owner.address, level=1234)
+    c5.issue(document).run(sender=owner.address, valid=False)
+    scenario.verify(c5.getIssuedBlock(document) == 1234)
+    scenario.verify(c5.isIssued(document))
+    scenario.verify(c5.isIssuedBefore(param1))
+    scenario.verify(~c5.isRevoked(document))
+
+    # revoke keeps the issued level in the same entry
+    c5.revoke(document).run(sender=owner.address, level=1234)
+    c5.revoke(document).run(sender=owner.address, valid=False)
+    scenario.verify(c5.isRevoked(document))
+    scenario.verify(c5.isRevokedBefore(param1))
+    scenario.verify(c5.getIssuedBlock(document) == 1234)
+
+    # a hash can be revoked without being issued
+    c5.revoke(target).run(sender=owner.address, level=1236)
+    scenario.verify(c5.isRevoked(target))
+    scenario.verify(~c5.isIssued(target))
+
+    scenario.verify_equal(
+        c5.getDocumentStatus([document, target]),
+        [
+            sp.record(document = document, issued = sp.some(1234), revoked = sp.some(1234)),
+            sp.record(document = target, issued = sp.none, revoked = sp.some(1236)),
+        ]
+    )
+
+
+@sp.add_test(name = "test multi-tenant")
+def test():
+    # init accounts
+    admin = sp.test_account("Admin")
+    owner1 = sp.test_account("Owner1")
+    owner2 = sp.test_account("Owner2")
+    newOwner = sp.test_account("NewOwner")
+
+    # init contract & scenario
+    scenario = sp.test_scenario()
+    c6 = MultiTenantDocumentStore(
+        admin.address,
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c6
+
+    # onboard issuers
+    c6.registerIssuer(owner1.address).run(sender=owner1.address, valid=False)
+    c6.registerIssuer(owner1.address).run(sender=admin.address)
+    c6.registerIssuer(owner2.address).run(sender=admin.address)
+    scenario.verify(c6.owner(0) == owner1.address)
+    scenario.verify(c6.owner(1) == owner2.address)
+
+    # init document
+    bytes_document = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    issuer1_document = sp.record(issuer = 0, document = bytes_document)
+    issuer2_document = sp.record(issuer = 1, document = bytes_document)
+
+    # issue: only the issuer's owner, keyed by issuer
+    c6.issue(issuer1_document).run(sender=owner2.address, valid=False)
+    c6.issue(issuer1_document).run(sender=owner1.address, level=1234)
+    scenario.verify(c6.isIssued(issuer1_document))
+    scenario.verify(~c6.isIssued(issuer2_document))
+    scenario.verify(c6.getIssuedBlock(issuer1_document) == 1234)
+    scenario.verify(c6.isIssuedBefore(sp.record(issuer = 0, document = bytes_document, blockNumber = 1235)))
+
+    # the same hash can be issued by another issuer
+    c6.bulkIssue(issuer = 1, documents = [bytes_document], idempotent = False).run(sender=owner2.address, level=1240)
+    scenario.verify(c6.getIssuedBlock(issuer2_document) == 1240)
+
+    # revoke
+    c6.revoke(issuer1_document).run(sender=owner1.address, level=1250)
+    scenario.verify(c6.isRevoked(issuer1_document))
+    scenario.verify(~c6.isRevoked(issuer2_document))
+    scenario.verify_equal(
+        c6.getDocumentStatus(sp.record(issuer = 1, documents = [bytes_document])),
+        [sp.record(document = bytes_document, issued = sp.some(1240), revoked = sp.none)]
+    )
+
+    # transferOwnership hands over one issuer only
+    c6.transferOwnership(issuer = 0, newOwner = newOwner.address).run(sender=owner1.address)
+    scenario.verify(c6.owner(0) == newOwner.address)
+    c6.bulkRevoke(issuer = 1, documents = [bytes_document], idempotent = False).run(sender=newOwner.address, valid=False)
+    c6.renounceOwnership(0).run(sender=newOwner.address)
+    scenario.verify(c6.owner(0) == nullAddress)
+
+
+@sp.add_test(name = "test replica")
+def test():
+    # The pure-Python replica must agree with the contract on every view
+    # after the same operation log. Run from this directory.
+    replica = sp.io.import_script_from_url("file:documentReplica.py")
+
+    owner = "tz1NXLfpxJ2bF7ehyvwQN69AUZh8FCGPgjmn"
+    issuer = "tz1aSkwEot3L2kmUvcoxzjMomb9mvBNuzFK6"
+    user = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+
+    scenario = sp.test_scenario()
+    c11 = DocumentStore(
+        sp.address(owner),
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c11
+    r11 = replica.DocumentStoreReplica(owner)
+
+    def toSmartPy(value):
+        if isinstance(value, str):
+            return sp.bytes(value) if value.startswith("0x") else sp.address(value)
+        if isinstance(value, dict):
+            return sp.record(**{k: toSmartPy(v) for k, v in value.items()})
+        if isinstance(value, list):
+            return [toSmartPy(v) for v in value]
+        return value
+
+    def apply(level, sender, entrypoint, parameter = None):
+        valid = True
+        try:
+            r11.apply(dict(level = level, sender = sender, entrypoint = entrypoint, parameter = parameter))
+        except replica.ReplicaError:
+            valid = False
+        call = getattr(c11, entrypoint)
+        call = call() if parameter is None else call(toSmartPy(parameter))
+        call.run(sender = sp.address(sender), level = level, valid = valid)
+
+    document1 = "0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00"
+    document2 = "0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01"
+    document3 = "0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee02"
+    epochRoot = "0x" + replica.merkle_root(document1, [document2, document3]).hex()
+
+    apply(100, user, "issue", document1)
+    apply(100, owner, "issue", document1)
+    apply(101, owner, "addIssuer", issuer)
+    apply(102, issuer, "bulkIssue", dict(documents = [document2, document1], idempotent = False))
+    apply(102, issuer, "bulkIssue", dict(documents = [document2, document1], idempotent = True))
+    apply(103, issuer, "revoke", document3)
+    apply(104, issuer, "revoke", document3)
+    apply(104, issuer, "bulkRevoke", dict(documents = [document1, document3], idempotent = True))
+    apply(105, owner, "commitEpoch", epochRoot)
+    apply(105, issuer, "commitEpoch", epochRoot)
+    apply(106, issuer, "revokeLeaves", dict(root = epochRoot, indices = [1, 300]))
+    apply(107, owner, "removeIssuer", issuer)
+    apply(108, issuer, "issue", document3)
+    apply(108, owner, "addIssuer", issuer)
+    apply(109, owner, "transferOwnership", user)
+    apply(109, issuer, "revoke", document2)
+    apply(110, owner, "renounceOwnership")
+    apply(110, user, "addIssuer", issuer)
+    apply(111, user, "renounceOwnership")
+
+    def option(value):
+        return sp.none if value is None else sp.some(value)
+
+    scenario.verify(c11.owner() == sp.address(r11.view("owner")))
+    for address in [owner, issuer, user]:
+        scenario.verify(c11.isIssuer(sp.address(address)) == r11.view("isIssuer", address))
+    for document in [document1, document2, document3]:
+        scenario.verify(c11.isIssued(sp.bytes(document)) == r11.view("isIssued", document))
+        scenario.verify(c11.isRevoked(sp.bytes(document)) == r11.view("isRevoked", document))
+        for blockNumber in [102, 103, 105]:
+            params = dict(document = document, blockNumber = blockNumber)
+            scenario.verify(c11.isIssuedBefore(toSmartPy(params)) == r11.view("isIssuedBefore", params))
+            scenario.verify(c11.isRevokedBefore(toSmartPy(params)) == r11.view("isRevokedBefore", params))
+    scenario.verify_equal(
+        c11.getDocumentStatus([sp.bytes(document1), sp.bytes(document3)]),
+        [
+            sp.record(document = sp.bytes("0x" + status["document"].hex()), issued = option(status["issued"]), revoked = option(status["revoked"]))
+            for status in r11.view("getDocumentStatus", [document1, document3])
+        ]
+    )
+    proof = dict(document = document2, proof = [document1, document3])
+    scenario.verify(c11.getEpochIssuedBlock(toSmartPy(proof)) == option(r11.view("getEpochIssuedBlock", proof)))
+    for index in [0, 1, 300]:
+        params = dict(root = epochRoot, index = index)
+        scenario.verify(c11.isLeafRevoked(toSmartPy(params)) == r11.view("isLeafRevoked", params))
+    for index, target in enumerate([document1, document2, document3]):
+        params = dict(target = target, proof = [document1, document3], root = epochRoot, index = index)
+        verification = r11.view("verifyDocument", params)
+        scenario.verify_equal(c11.verifyDocument(sp.record(
+            target = sp.bytes(target), proof = toSmartPy(params["proof"]), root = sp.bytes(epochRoot), index = index
+        )), sp.record(
+            proofValid = verification["proofValid"],
+            rootIssued = option(verification["rootIssued"]),
+            rootRevoked = option(verification["rootRevoked"]),
+            targetRevoked = option(verification["targetRevoked"]),
+            leafRevoked = verification["leafRevoked"],
+            valid = verification["valid"]
+        ))
+
+
+@sp.add_test(name = "test verify document")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+
+    # batch of three targets: root = H(H(target1, target2), target3)
+    target1 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    target2 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+    target3 = sp.bytes("0x917fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee02")
+    node12 = sp.keccak(target1 + target2)
+    root = sp.keccak(node12 + target3)
+
+    def verification(proofValid, rootIssued, rootRevoked, targetRevoked, valid, leafRevoked = False):
+        return sp.record(proofValid = proofValid, rootIssued = rootIssued, rootRevoked = rootRevoked,
+                         targetRevoked = targetRevoked, leafRevoked = leafRevoked, valid = valid)
+
+    # both storage layouts answer the same
+    scenario = sp.test_scenario()
+    for store in [DocumentStore, DocumentStoreUnified]:
+        c15 = store(
+            owner.address,
+            metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+        )
+        scenario += c15
+        def verifyDocument(target, proof, index, root = root):
+            return c15.verifyDocument(sp.record(target = target, proof = proof, root = root, index = index))
+
+        scenario.verify_equal(verifyDocument(target1, [target2, target3], 0), verification(True, sp.none, sp.none, sp.none, False))
+
+        c15.issue(root).run(sender=owner.address, level=100)
+        scenario.verify_equal(verifyDocument(target1, [target2, target3], 0), verification(True, sp.some(100), sp.none, sp.none, True))
+        scenario.verify_equal(verifyDocument(target3, [node12], 2), verification(True, sp.some(100), sp.none, sp.none, True))
+        # a proof of another batch
+        scenario.verify_equal(verifyDocument(target1, [target3], 0), verification(False, sp.some(100), sp.none, sp.none, False))
+
+        # revoking one target leaves the rest of the batch valid
+        c15.revoke(target2).run(sender=owner.address, level=110)
+        scenario.verify_equal(verifyDocument(target2, [target1, target3], 1), verification(True, sp.some(100), sp.none, sp.some(110), False))
+        scenario.verify_equal(verifyDocument(target1, [target2, target3], 0), verification(True, sp.some(100), sp.none, sp.none, True))
+
+        # a leaf revoked by its index is no longer valid, the others are
+        c15.revokeLeaves(root = root, indices = [0]).run(sender=owner.address, level=115)
+        scenario.verify_equal(verifyDocument(target1, [target2, target3], 0),
+            verification(True, sp.some(100), sp.none, sp.none, False, leafRevoked = True))
+        scenario.verify_equal(verifyDocument(target3, [node12], 2), verification(True, sp.some(100), sp.none, sp.none, True))
+
+        # revoking the root revokes the whole batch
+        c15.revoke(root).run(sender=owner.address, level=120)
+        scenario.verify_equal(verifyDocument(target3, [node12], 2), verification(True, sp.some(100), sp.some(120), sp.none, False))
+
+        # a root committed as an epoch is issued at the epoch level
+        c15.commitEpoch(node12).run(sender=owner.address, level=130)
+        scenario.verify_equal(verifyDocument(target1, [target2], 0, node12), verification(True, sp.some(130), sp.none, sp.none, True))
+
+@sp.add_test(name = "test change log")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+
+    # init contract & scenario
+    scenario = sp.test_scenario()
+    c13 = DocumentStore(
+        owner.address,
+        changeLog = True,
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c13
+
+    document1 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+    document2 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee01")
+    document3 = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee02")
+    def change(document, action, level):
+        return sp.record(document = document, action = sp.variant(action, sp.unit), level = level)
+    def changesSince(level, cursor, limit):
+        return c13.changesSince(sp.record(level = level, cursor = cursor, limit = limit))
+
+    scenario.verify_equal(changesSince(0, 0, 10), sp.record(changes = [], cursor = 0, changeCount = 0))
+
+    c13.issue(document1).run(sender=owner.address, level=100)
+    c13.bulkIssue(documents = [document2, document1], idempotent = True).run(sender=owner.address, level=110)
+    c13.revoke(document1).run(sender=owner.address, level=120)
+    c13.bulkRevoke(documents = [document3], idempotent = False).run(sender=owner.address, level=130)
+
+    # skipped hashes of idempotent batches are not changes
+    scenario.verify_equal(changesSince(0, 0, 10), sp.record(
+        changes = [change(document1, "issue", 100), change(document2, "issue", 110),
+                   change(document1, "revoke", 120), change(document3, "revoke", 130)],
+        cursor = 4, changeCount = 4))
+
+    # catch up from a level, page by page
+    scenario.verify_equal(changesSince(105, 0, 2), sp.record(
+        changes = [change(document2, "issue", 110), change(document1, "revoke", 120)],
+        cursor = 3, changeCount = 4))
+    scenario.verify_equal(changesSince(105, 3, 2), sp.record(
+        changes = [change(document3, "revoke", 130)], cursor = 4, changeCount = 4))
+    scenario.verify_equal(changesSince(131, 0, 2), sp.record(changes = [], cursor = 4, changeCount = 4))
+
+    # epoch roots and newly revoked leaves are changes too
+    c13.commitEpoch(document3).run(sender=owner.address, level=140)
+    c13.revokeLeaves(root = document3, indices = [5, 300, 5]).run(sender=owner.address, level=150)
+    c13.revokeLeaves(root = document3, indices = [300]).run(sender=owner.address, level=160)
+    scenario.verify_equal(changesSince(140, 0, 10), sp.record(
+        changes = [change(document3, "commitEpoch", 140),
+                   sp.record(document = document3, action = sp.variant("revokeLeaf", 5), level = 150),
+                   sp.record(document = document3, action = sp.variant("revokeLeaf", 300), level = 150)],
+        cursor = 7, changeCount = 7))
+
+@sp.add_test(name = "test operation packer")
+def test():
+    # Batches of the packer are valid bulkIssue calls, in queue order, and
+    # its parameter sizes match the Micheline encoding. Run from this directory.
+    packer = sp.io.import_script_from_url("file:operationPacker.py")
+
+    owner = sp.test_account("Owner")
+    scenario = sp.test_scenario()
+    c14 = DocumentStore(
+        owner.address,
+        metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")
+    )
+    scenario += c14
+
+    # 48 hashes of 37 bytes fit in 2000 bytes, 20 in 100000 gas
+    model = packer.CostModel("bulkIssue", gas = (20000, 4000), storage = (0, 110))
+    sizeLimited = packer.Packer(model, limits = dict(size = 2000), margin = 0)
+    gasLimited = packer.Packer(model, limits = dict(gas = 100000), margin = 0)
+    documents = ["0x%064x" % i for i in range(100)]
+    assert [len(batch) for batch in sizeLimited.pack(documents)] == [48, 48, 4]
+    assert [len(batch) for batch in gasLimited.pack(documents)] == [20, 20, 20, 20, 20]
+
+    level = 100
+    for batch in sizeLimited.pack(documents):
+        params = sp.record(documents = [sp.bytes(d) for d in batch], idempotent = False)
+        estimate = sizeLimited.estimate(batch)
+        assert estimate["size"] <= 2000
+        parameterSize = estimate["size"] - packer.OPERATION_SIZE - packer.TRANSACTION_SIZE - len("bulkIssue")
+        # packed data starts with one 0x05 byte
+        scenario.verify_equal(sp.len(sp.pack(params)), parameterSize + 1)
+        c14.bulkIssue(params).run(sender=owner.address, level=level)
+        level += 1
+    for document in documents:
+        scenario.verify(c14.isIssued(sp.bytes(document)))
+
+@sp.add_test(name = "test on-chain views")
+def test():
+    # init accounts
+    owner = sp.test_account("Owner")
+
+    # init contracts & scenario
+    scenario = sp.test_scenario()
+    for c12 in [
+        DocumentStore(owner.address, metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/")),
+        DocumentStoreUnified(owner.address, metadata = sp.utils.metadata_of_url("https://gateway.pinata.cloud/ipfs/"))
+    ]:
+        scenario += c12
+        gate = DocumentGate(c12.address)
+        scenario += gate
+
+        document = sp.bytes("0x517fbae26bb7b66dd2f7155078e063ae37f77079681e7f5a5f7288ffa78fee00")
+        gate.check(document).run(valid=False)
+
+        c12.issue(document).run(sender=owner.address, level=1234)
+        scenario.verify(sp.view("isIssued", c12.address, document, t = sp.TBool).open_some())
+        scenario.verify(~sp.view("isRevoked", c12.address, document, t = sp.TBool).open_some())
+        scenario.verify(sp.view("getIssuedBlock", c12.address, document, t = sp.TNat).open_some() == 1234)
+        gate.check(document).run()
+        scenario.verify(gate.data.checks == 1)
+
+        c12.revoke(document).run(sender=owner.address, level=1240)
+        scenario.verify_equal(
+            sp.view("getDocumentStatus", c12.address, document, t = tDocumentStatus).open_some(),
+            sp.record(document = document, issued = sp.some(1234), revoked = sp.some(1240))
+        )
+        gate.check(document).run(valid=False)
+        scenario.verify(gate.data.checks == 1)
+
 sp.add_compilation_target(
     "DocumentStore", 
     DocumentStore(
@@ -171,3 +1479,39 @@ sp.add_compilation_target(
     )
 )
 
+sp.add_compilation_target(
+    "DocumentStoreChangeLog", 
+    DocumentStore(
+        ContractOwner,
+        changeLog = True,
+        metadata = sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+)
+
+sp.add_compilation_target(
+    "DocumentStoreUnified", 
+    DocumentStoreUnified(
+        ContractOwner,
+        metadata = sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+)
+
+sp.add_compilation_target(
+    "MultiTenantDocumentStore", 
+    MultiTenantDocumentStore(
+        ContractOwner,
+        metadata = sp.utils.metadata_of_url(
+            "https://gateway.pinata.cloud/ipfs/"
+        )
+    )
+)
+
+# The store address is a placeholder, set at origination
+sp.add_compilation_target(
+    "DocumentGate", 
+    DocumentGate(sp.address("KT18amZmM5W7qDWVt2pH6uj7sCEd3kbzLrHT"))
+)